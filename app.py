@@ -1,27 +1,154 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import joblib
 import os
-import sqlite3
-from src.models.diabetes_model import predict_diabetes
-from src.models.ulcer_model import create_ulcer_model
-from src.utils.report_generator import ReportGenerator
+import io
+import time
+from src.utils import metrics
+from src.utils.timing import mark, timings
+from src.models.diabetes_model import FEATURE_COLUMNS, predict_diabetes, score_csv
+from src.models.ulcer_model import interpret_ulcer_prediction, score_images
+from src.models.inference_server import BatchingPredictor
+from src.models.loader import (DIABETES_MODEL_PATH, ULCER_MODEL_PATH, TFLITE_ULCER_MODEL_PATH,
+                               load_diabetes_model, load_ulcer_model, warm_up)
+from src.utils.image_processing import (IMAGE_SIZE, content_hash, decoder_pool, preprocess_image,
+                                       read_zip_images)
+from src.utils.image_store import IMAGE_STORE_DIR, ImageStore
+from src.utils.prediction_cache import PredictionCache, features_key, file_fingerprint
+from src.utils.report_jobs import ReportJobQueue
 from src.database.database_manager import DatabaseManager
-import tensorflow as tf
-from tensorflow.keras.preprocessing import image as keras_image
-from tensorflow.keras.preprocessing import image as keras_image
+from src.database import analytics
 
-# Initialize database
-db = DatabaseManager('diacare_db.sqlite3')
-report_gen = ReportGenerator('reports')
+mark('startup:imports')
+
+# DIACARE_DIABETES_ENGINE=compiled scores with the array-backed forest
+# (model/diabetes_model.npz, exported by src.models.forest_engine)
+DIABETES_ENGINE = os.environ.get('DIACARE_DIABETES_ENGINE', 'sklearn')
+
+# DIACARE_ULCER_BACKEND=tflite runs the quantized model written by
+# src.models.tflite_backend (DIACARE_TFLITE_MODEL) on DIACARE_TFLITE_THREADS threads
+ULCER_OPTIONS = {'backend': os.environ.get('DIACARE_ULCER_BACKEND', 'keras')}
+if ULCER_OPTIONS['backend'] == 'tflite':
+    ULCER_OPTIONS['tflite_path'] = os.environ.get('DIACARE_TFLITE_MODEL', TFLITE_ULCER_MODEL_PATH)
+    if os.environ.get('DIACARE_TFLITE_THREADS'):
+        ULCER_OPTIONS['num_threads'] = int(os.environ['DIACARE_TFLITE_THREADS'])
+
+# Choices for a diabetes record's confirmed diagnosis (diabetes_records.outcome)
+OUTCOME_LABELS = {None: "Not confirmed", 0: "No diabetes", 1: "Diabetes"}
+
+# Models and heavy libraries (sklearn, tensorflow, reportlab) are loaded on
+# first use by the page that needs them, so Home and Patient Records start fast
+def get_diabetes_model():
+    try:
+        with st.spinner("Loading diabetes model..."):
+            return load_diabetes_model(DIABETES_ENGINE)
+    except Exception as e:
+        st.error(f"Error loading models: {str(e)}")
+        st.stop()
+
+# One micro-batching service per process, shared by all sessions
+@st.cache_resource
+def load_ulcer_predictor():
+    return BatchingPredictor(load_ulcer_model(**ULCER_OPTIONS), max_batch_size=32, max_wait_ms=10)
+
+def get_ulcer_predictor():
+    try:
+        with st.spinner("Loading foot ulcer model..."):
+            return load_ulcer_predictor()
+    except Exception as e:
+        st.error(f"Error loading models: {str(e)}")
+        st.stop()
+
+# Prediction caches tagged with each model file's hash. Set
+# DIACARE_PREDICTION_CACHE to a SQLite path to keep entries across restarts
+@st.cache_resource
+def get_diabetes_cache():
+    return PredictionCache('diabetes', file_fingerprint(DIABETES_MODEL_PATH), max_entries=4096,
+                           disk_path=os.environ.get('DIACARE_PREDICTION_CACHE'))
+
+@st.cache_resource
+def get_ulcer_cache():
+    model_path = ULCER_OPTIONS.get('tflite_path', ULCER_MODEL_PATH)
+    return PredictionCache('ulcer', file_fingerprint(model_path), max_entries=1024,
+                           disk_path=os.environ.get('DIACARE_PREDICTION_CACHE'))
+
+# Shared thread pool for decoding batch uploads in parallel
+@st.cache_resource
+def get_decoder_pool():
+    return decoder_pool()
+
+# Ulcer photos with pre-generated thumbnails; see src/utils/image_store.py
+@st.cache_resource
+def get_image_store():
+    return ImageStore(os.path.join(os.getcwd(), IMAGE_STORE_DIR))
+
+@st.cache_resource
+def get_report_generator():
+    from src.utils.report_generator import ReportGenerator
+    return ReportGenerator('reports', db=get_database())
+
+# PDF reports are built on a background worker pool; the page offers the
+# download once the job is done, or builds the report on demand
+@st.cache_resource
+def get_report_queue():
+    return ReportJobQueue(get_report_generator(), get_database(), max_workers=2)
+
+def submit_report(state_key, patient_data, patient_id, assessment_id, **results):
+    job_id = get_report_queue().submit(patient_data, patient_id, assessment_id=assessment_id, **results)
+    st.session_state[state_key] = {'job_id': job_id, 'patient_data': patient_data, 'results': results,
+                                   'patient_id': patient_id, 'assessment_id': assessment_id}
+
+def show_report_download(state_key, file_name):
+    report = st.session_state[state_key]
+    job = get_report_queue().status(report['job_id'])
+    
+    if job and job['status'] == 'done' and os.path.exists(job['report_path']):
+        report_path = job['report_path']
+    else:
+        if job and job['status'] in ('queued', 'running'):
+            st.info("Your report is being generated in the background.")
+            st.button("Check Report Status", key=f"{state_key}_refresh")
+        elif job and job['status'] == 'failed':
+            st.warning(f"Background report generation failed: {job['error']}")
+        
+        if not st.button("Generate Report Now", key=f"{state_key}_now"):
+            return
+        report_path = get_report_generator().generate_report(
+            report['patient_data'], patient_id=report['patient_id'],
+            assessment_id=report['assessment_id'], **report['results']
+        )
+    
+    with open(report_path, "rb") as file:
+        st.download_button(
+            label="Download Report",
+            data=file,
+            file_name=file_name,
+            mime="application/pdf",
+            key=f"{state_key}_download"
+        )
+
+# PDFs written before the reports table existed are indexed once per process
+@st.cache_resource
+def index_existing_reports():
+    return get_database().index_report_files('reports')
+
+# DIACARE_METRICS=1 turns on hot-path metrics; DIACARE_METRICS_PORT also serves
+# them in Prometheus format at http://127.0.0.1:<port>/metrics
+@st.cache_resource
+def start_metrics_server():
+    if os.environ.get('DIACARE_METRICS_PORT'):
+        metrics.enable()
+        return metrics.start_http_server(int(os.environ['DIACARE_METRICS_PORT']))
+
+# Population aggregates, recomputed only when a new export lands
+@st.cache_data
+def load_population_stats(export_mtime):
+    return (analytics.population_summary(), analytics.risk_by_age_band(),
+            analytics.glucose_distribution(), analytics.ulcer_prevalence_by_month())
 
-# Load models
 @st.cache_resource
-def load_models():
-    diabetes_model = joblib.load('model/diabetes_model.pkl')
-    ulcer_model = tf.keras.models.load_model('model/foot_ulcer_model.h5')
-    return diabetes_model, ulcer_model
+def start_model_warm_up():
+    return warm_up(DIABETES_ENGINE, **ULCER_OPTIONS)
 
 # UI Configuration
 st.set_page_config(
@@ -31,6 +158,15 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Initialize database - one manager per process so sessions share its
+# per-thread persistent connections instead of reconnecting on every rerun
+@st.cache_resource
+def get_database():
+    return DatabaseManager('diacare_db.sqlite3')
+
+db = get_database()
+start_metrics_server()
+
 # Custom CSS
 st.markdown("""
 <style>
@@ -57,18 +193,17 @@ st.markdown("""
 
 # Sidebar navigation
 st.sidebar.title("🥼 DiaCare AI")
+pages = ["Home", "Diabetes Risk Assessment", "Bulk Diabetes Scoring", "Foot Ulcer Detection", "Patient Records",
+         "Report Manager", "Population Dashboard"]
+# The metrics page is only listed for operators (DIACARE_ADMIN=1)
+if os.environ.get('DIACARE_ADMIN', '0') == '1':
+    pages.append("Metrics")
+
 page = st.sidebar.selectbox(
     "Choose a Module",
-    ["Home", "Diabetes Risk Assessment", "Foot Ulcer Detection", "Patient Records"]
+    pages
 )
 
-# Load models
-try:
-    diabetes_model, ulcer_model = load_models()
-except Exception as e:
-    st.error(f"Error loading models: {str(e)}")
-    st.stop()
-
 # Home Page
 if page == "Home":
     st.title("Welcome to DiaCare AI")
@@ -97,6 +232,8 @@ if page == "Home":
 # Diabetes Risk Assessment
 elif page == "Diabetes Risk Assessment":
     st.title("Diabetes Risk Assessment")
+    diabetes_model = get_diabetes_model()
+    diabetes_cache = get_diabetes_cache()
     
     with st.form("diabetes_form"):
         col1, col2 = st.columns(2)
@@ -117,6 +254,9 @@ elif page == "Diabetes Risk Assessment":
             
         submitted = st.form_submit_button("Analyze")
         
+    with st.expander("Prediction Cache"):
+        st.json(diabetes_cache.stats())
+    
     if submitted:
         # Prepare data for model prediction
         model_input_data = {
@@ -141,12 +281,16 @@ elif page == "Diabetes Risk Assessment":
             'diabetes_pedigree': diabetes_pedigree,
         }
 
-        # Run Prediction
-        result = predict_diabetes(diabetes_model, model_input_data)
+        # Run Prediction - identical resubmissions are served from the cache
+        result = diabetes_cache.get_or_compute(
+            features_key(model_input_data, FEATURE_COLUMNS),
+            lambda: predict_diabetes(diabetes_model, model_input_data)
+        )
 
-        # Save to database
-        patient_id = db.add_patient(name, age, gender)
-        db.add_diabetes_record(patient_id, db_input_data, result['prediction'], result['probability'])
+        # Save patient and assessment in one transaction
+        patient_id, record_id = db.add_diabetes_assessment(
+            name, age, gender, db_input_data, result['prediction'], result['probability']
+        )
 
         # Display results
         st.success("Analysis Complete!")
@@ -179,22 +323,55 @@ elif page == "Diabetes Risk Assessment":
             'probability': result['probability']
         }
         
-        report_path = report_gen.generate_report(
-            {'name': name, 'age': age, 'gender': gender},
-            diabetes_result=report_data
-        )
+        submit_report('diabetes_report', {'name': name, 'age': age, 'gender': gender},
+                      patient_id, record_id, diabetes_result=report_data)
+    
+    if 'diabetes_report' in st.session_state:
+        report_name = st.session_state['diabetes_report']['patient_data']['name']
+        show_report_download('diabetes_report', f"{report_name}_diabetes_report.pdf")
 
-        with open(report_path, "rb") as file:
-            st.download_button(
-                label="Download Report",
-                data=file,
-                file_name=f"{name}_diabetes_report.pdf",
-                mime="application/pdf"
-            )
+# Bulk Diabetes Scoring
+elif page == "Bulk Diabetes Scoring":
+    st.title("Bulk Diabetes Scoring")
+    st.write("Upload a CSV with the same columns as data/diabetes.csv. "
+             "Rows are scored in chunks, so large extracts stay within memory.")
+    diabetes_model = get_diabetes_model()
+    
+    csv_file = st.file_uploader("Upload Screening CSV", type=['csv'])
+    chunksize = st.number_input("Rows per chunk", 1000, 100000, 10000, step=1000)
+    
+    if csv_file and st.button("Score File"):
+        output = io.StringIO()
+        status = st.empty()
+        start = time.perf_counter()
+        
+        def show_progress(rows):
+            elapsed = time.perf_counter() - start
+            status.write(f"Scored {rows} rows ({rows / max(elapsed, 1e-9):.0f} rows/sec)")
+        
+        try:
+            rows = score_csv(diabetes_model, csv_file, output, chunksize=int(chunksize),
+                             n_jobs=-1, on_chunk=show_progress)
+        except KeyError as e:
+            st.error(f"CSV is missing a required column: {str(e)}")
+            st.stop()
+        except (pd.errors.EmptyDataError, pd.errors.ParserError) as e:
+            st.error(f"Could not read the CSV: {str(e)}")
+            st.stop()
+        
+        st.success(f"Scored {rows} rows in {time.perf_counter() - start:.2f}s")
+        st.download_button(
+            label="Download Scored CSV",
+            data=output.getvalue(),
+            file_name=f"scored_{csv_file.name}",
+            mime="text/csv"
+        )
 
 # Foot Ulcer Detection
 elif page == "Foot Ulcer Detection":
     st.title("Foot Ulcer Detection")
+    ulcer_predictor = get_ulcer_predictor()
+    ulcer_cache = get_ulcer_cache()
     
     col1, col2 = st.columns(2)
     
@@ -204,64 +381,66 @@ elif page == "Foot Ulcer Detection":
         gender = st.selectbox("Gender", ["Male", "Female", "Other"])
         
     with col2:
-        uploaded_file = st.file_uploader("Upload Foot Image", type=['jpg', 'png', 'jpeg'])
+        batch_mode = st.checkbox("Batch mode (many images or a ZIP folder)")
+        if batch_mode:
+            uploaded_file = None
+            uploaded_files = st.file_uploader("Upload Foot Images", type=['jpg', 'png', 'jpeg', 'zip'],
+                                              accept_multiple_files=True)
+        else:
+            uploaded_file = st.file_uploader("Upload Foot Image", type=['jpg', 'png', 'jpeg'])
         
-    if uploaded_file and name:
-        # Use the project directory to create a temporary path
-        project_root = os.getcwd() 
-        temp_dir = os.path.join(project_root, 'temp')
-
-        # Create 'temp' directory if it doesn't exist
-        os.makedirs(temp_dir, exist_ok=True)
+    with st.expander("Inference Service Metrics"):
+        st.json(ulcer_predictor.metrics())
+        st.write("Prediction Cache")
+        st.json(ulcer_cache.stats())
     
-        # Save and process image
-        image_path = os.path.join(temp_dir, uploaded_file.name)
-        with open(image_path, "wb") as f:
-            f.write(uploaded_file.getvalue())
-        
-        # Prepare image for model - use 128x128 as expected by the model
-        img = tf.keras.preprocessing.image.load_img(
-            image_path, target_size=(128, 128)
-        )
-        img_array = tf.keras.preprocessing.image.img_to_array(img)
-        img_array = tf.expand_dims(img_array, 0)
-        # Normalize pixel values to [0, 1]
-        img_array = img_array / 255.0
+    if uploaded_file and name:
+        image_bytes = uploaded_file.getvalue()
         
-        # Get prediction
+        def run_ulcer_model():
+            # Decode, resize to the model's 128x128 input and normalize in memory,
+            # then predict batched with any concurrent requests from other sessions
+            with metrics.span('ulcer.preprocess'):
+                img_array = preprocess_image(image_bytes, IMAGE_SIZE)
+            with metrics.span('ulcer.predict'):
+                predictions = ulcer_predictor.predict(img_array)
+            return interpret_ulcer_prediction(predictions[0])
+        
+        # Get prediction - re-uploads of the same photo are served from the cache
+        image_hash = content_hash(image_bytes)
         try:
-            predictions = ulcer_model.predict(img_array)
-            # Handle both binary classification outputs
-            if predictions.shape[1] > 1:
-                score = float(predictions[0][1])  # Probability of ulcer class
-            else:
-                score = float(predictions[0][0])  # Single output
-            
-            result = {
-                'prediction': "Ulcer Detected" if score > 0.5 else "Normal",
-                'probability': score * 100 if score > 0.5 else (1 - score) * 100,
-                'image_path': image_path
-            }
+            result = ulcer_cache.get_or_compute(image_hash, run_ulcer_model)
         except Exception as e:
             st.error(f"Error during prediction: {str(e)}")
-            st.info(f"Input shape: {img_array.shape}. Please check if the model file is correct.")
+            st.info(f"Expected a {IMAGE_SIZE[0]}x{IMAGE_SIZE[1]} RGB model input. "
+                    "Please check if the image and model file are correct.")
             st.stop()
         
-        # Save to database
-        patient_id = db.add_patient(name, age, gender)
-        db.add_ulcer_record(
-            patient_id,
-            image_path,
-            result['prediction'],
-            result['probability']
-        )
+        # Save patient and assessment in one transaction, once per assessment
+        # rather than on every rerun of the page
+        assessment_key = (image_hash, name, age, gender)
+        if st.session_state.get('ulcer_assessment_key') != assessment_key:
+            # Store the image and its thumbnails only now that the record is
+            # being saved
+            with metrics.span('ulcer.persist_image'):
+                result['image_path'] = get_image_store().put(image_bytes, image_hash)
+            
+            patient_id, record_id = db.add_ulcer_assessment(
+                name, age, gender,
+                result['image_path'],
+                result['prediction'],
+                result['probability']
+            )
+            submit_report('ulcer_report', {'name': name, 'age': age, 'gender': gender},
+                          patient_id, record_id, ulcer_result=result)
+            st.session_state['ulcer_assessment_key'] = assessment_key
         
         # Display results
         st.success("Analysis Complete!")
         col1, col2 = st.columns(2)
         
         with col1:
-            st.image(image_path, caption="Analyzed Image", use_column_width=True)
+            st.image(image_bytes, caption="Analyzed Image", use_column_width=True)
             
         with col2:
             st.metric(
@@ -274,19 +453,90 @@ elif page == "Foot Ulcer Detection":
                 f"{result['probability']:.1f}%"
             )
         
-        # Generate report
-        report_path = report_gen.generate_report(
-            {'name': name, 'age': age, 'gender': gender},
-            ulcer_result=result
-        )
+        show_report_download('ulcer_report', f"{name}_ulcer_report.pdf")
+
+    if batch_mode and uploaded_files and name and st.button("Analyze Batch"):
+        # Expand ZIP folders into their images
+        images = []
+        for f in uploaded_files:
+            if f.name.lower().endswith('.zip'):
+                images.extend(read_zip_images(f.getvalue()))
+            else:
+                images.append((f.name, f.getvalue()))
         
-        with open(report_path, "rb") as file:
-            st.download_button(
-                label="Download Report",
-                data=file,
-                file_name=f"{name}_ulcer_report.pdf",
-                mime="application/pdf"
-            )
+        if not images:
+            st.warning("No JPG or PNG images found in the upload.")
+            st.stop()
+        
+        # Only photos not seen before go through the model
+        hashes = [content_hash(data) for _, data in images]
+        known = {}
+        for image_hash in dict.fromkeys(hashes):
+            cached = ulcer_cache.get(image_hash)
+            if cached is not None:
+                known[image_hash] = cached
+        new_images = {h: data for h, (_, data) in zip(hashes, images) if h not in known}
+        
+        progress = st.progress(0.0)
+        status = st.empty()
+        start = time.perf_counter()
+        
+        def show_progress(done):
+            elapsed = time.perf_counter() - start
+            progress.progress(done / len(new_images))
+            status.write(f"Analyzed {done} of {len(new_images)} new images "
+                         f"({done / max(elapsed, 1e-9):.1f} images/sec)")
+        
+        try:
+            with metrics.span('ulcer.score_batch'):
+                scored = score_images(ulcer_predictor, new_images.values(), IMAGE_SIZE, batch_size=32,
+                                      executor=get_decoder_pool(), on_batch=show_progress)
+        except Exception as e:
+            st.error(f"Error during prediction: {str(e)}")
+            st.stop()
+        for image_hash, result in zip(new_images, scored):
+            ulcer_cache.put(image_hash, result)
+            known[image_hash] = result
+        progress.progress(1.0)
+        
+        image_store = get_image_store()
+        results = []
+        for (file_name, data), image_hash in zip(images, hashes):
+            result = dict(known[image_hash])
+            with metrics.span('ulcer.persist_image'):
+                result['image_path'] = image_store.put(data, image_hash)
+            result['file'] = file_name
+            results.append(result)
+        
+        # Save the patient and every result in one transaction
+        patient_id, record_ids = db.add_ulcer_batch(name, age, gender, results)
+        seconds = time.perf_counter() - start
+        
+        st.session_state['ulcer_batch'] = {
+            'patient_id': patient_id,
+            'seconds': seconds,
+            'results': pd.DataFrame({
+                'Record ID': record_ids,
+                'File': [r['file'] for r in results],
+                'Result': [r['prediction'] for r in results],
+                'Confidence (%)': [round(r['probability'], 1) for r in results],
+            })
+        }
+    
+    if batch_mode and 'ulcer_batch' in st.session_state:
+        batch = st.session_state['ulcer_batch']
+        results = batch['results']
+        st.success(f"Analyzed {len(results)} images in {batch['seconds']:.2f}s "
+                   f"({len(results) / max(batch['seconds'], 1e-9):.1f} images/sec)")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Ulcers Detected", int((results['Result'] == "Ulcer Detected").sum()))
+        with col2:
+            st.metric("Patient ID", batch['patient_id'])
+        
+        # Click a column header to sort
+        st.dataframe(results, use_container_width=True)
 
 # Patient Records
 elif page == "Patient Records":
@@ -296,63 +546,189 @@ elif page == "Patient Records":
     search_name = st.text_input("Search Patient by Name")
     
     if search_name:
-        conn = sqlite3.connect('diacare_db.sqlite3')
-        df = pd.read_sql_query(
-            "SELECT * FROM patients WHERE name LIKE ?",
-            conn,
-            params=[f"%{search_name}%"]
-        )
+        total = db.count_patients(search_name)
         
-        if not df.empty:
-            st.write("Found Patients:")
-            for _, row in df.iterrows():
+        if total:
+            page_size = 20
+            page_count = (total + page_size - 1) // page_size
+            page_number = st.number_input(f"Page (of {page_count})", 1, page_count, 1)
+            patients = db.search_patients(search_name, limit=page_size,
+                                          offset=(page_number - 1) * page_size)
+            
+            # Records are only fetched for expanders the user opened, in one
+            # set-based query for the whole page
+            opened = [p['id'] for p in patients if st.session_state.get(f"show_records_{p['id']}")]
+            page_records = db.get_records_for_patients(opened)
+            
+            st.write(f"Found {total} Patients:")
+            for row in patients:
                 with st.expander(f"{row['name']} (ID: {row['id']})"):
-                    records = db.get_patient_records(row['id'])
-                    
                     st.write("### Patient Information")
                     st.write(f"Age: {row['age']}")
                     st.write(f"Gender: {row['gender']}")
                     
-                    if records['diabetes_records']:
-                        st.write("### Diabetes Records")
-                        for record in records['diabetes_records']:
-                            st.write(f"Date: {record['created_at']}")
-                            st.write(f"Risk: {'High' if record['prediction'] == 1 else 'Low'}")
-                            st.write(f"Confidence: {record['probability']:.1f}%")
-                    
-                    if records['ulcer_records']:
-                        st.write("### Foot Ulcer Records")
-                        for record in records['ulcer_records']:
-                            st.write(f"Date: {record['created_at']}")
-                            st.write(f"Result: {record['prediction']}")
-                            st.write(f"Confidence: {record['probability']:.1f}%")
-                            if os.path.exists(record['image_path']):
-                                st.image(record['image_path'], width=200)
+                    show = st.checkbox("Show records", key=f"show_records_{row['id']}")
+                    if show and row['id'] in page_records:
+                        records = page_records[row['id']]
+                        
+                        if records['diabetes_records']:
+                            st.write("### Diabetes Records")
+                            for record in records['diabetes_records']:
+                                st.write(f"Date: {record['created_at']}")
+                                st.write(f"Risk: {'High' if record['prediction'] == 1 else 'Low'}")
+                                st.write(f"Confidence: {record['probability']:.1f}%")
+                                # Confirmed outcomes become training data for src.models.training
+                                outcome = st.selectbox(
+                                    "Confirmed diagnosis", list(OUTCOME_LABELS),
+                                    index=list(OUTCOME_LABELS).index(record['outcome']),
+                                    format_func=OUTCOME_LABELS.get, key=f"outcome_{record['id']}"
+                                )
+                                if outcome != record['outcome']:
+                                    db.set_diabetes_outcome(record['id'], outcome)
+                                    st.success("Diagnosis saved")
+                        
+                        if records['ulcer_records']:
+                            st.write("### Foot Ulcer Records")
+                            for record in records['ulcer_records']:
+                                st.write(f"Date: {record['created_at']}")
+                                st.write(f"Result: {record['prediction']}")
+                                st.write(f"Confidence: {record['probability']:.1f}%")
+                                # A small pre-generated preview, not the original
+                                thumbnail = get_image_store().variant(record['image_path'], 'thumb')
+                                if thumbnail:
+                                    st.image(thumbnail, width=200)
         else:
             st.info("No patients found with that name.")
 
 # Report Manager Page
 elif page == "Report Manager":
     st.title("Generated Reports")
+    
+    # Reports are listed from the reports table; PDF bytes are only read for
+    # the report the user chose to download
+    index_existing_reports()
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        search_name = st.text_input("Filter by Patient Name")
+    with col2:
+        report_type = st.selectbox("Assessment", ["All", "diabetes", "ulcer"])
+    report_type = None if report_type == "All" else report_type
+    
+    total = db.count_reports(search_name, report_type)
+    
+    if not total:
+        st.info("No reports match these filters." if search_name or report_type
+                else "No reports have been generated yet.")
+    else:
+        page_size = 20
+        page_count = (total + page_size - 1) // page_size
+        page_number = st.number_input(f"Page (of {page_count})", 1, page_count, 1)
+        reports = db.search_reports(search_name, report_type, limit=page_size,
+                                    offset=(page_number - 1) * page_size)
+        
+        st.write(f"Found {total} Reports:")
+        for report in reports:
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.write(f"**{report['file_name']}**")
+                st.caption(f"{report['patient_name'] or 'Unlinked'} | "
+                           f"{report['assessment_type'] or 'unknown'} | "
+                           f"{report['size_bytes'] / 1024:.0f} KB | {report['created_at']}")
+            with col2:
+                prepared = st.session_state.get('prepared_report') == report['id']
+                if not prepared and st.button("Prepare Download", key=f"prepare_report_{report['id']}"):
+                    st.session_state['prepared_report'] = report['id']
+                    prepared = True
+                
+                if prepared and os.path.exists(report['path']):
+                    with open(report['path'], "rb") as file:
+                        st.download_button(
+                            label="Download",
+                            data=file,
+                            file_name=report['file_name'],
+                            mime="application/pdf",
+                            key=f"download_report_{report['id']}"
+                        )
+                elif prepared:
+                    st.warning("Report file is missing.")
 
-    reports_dir = 'reports'
-
-    if not os.path.exists(reports_dir):
-        st.warning("No reports have been generated yet.")
+# Population Dashboard
+elif page == "Population Dashboard":
+    st.title("Population Dashboard")
+    st.write("Cohort summaries over the Parquet export of the assessment history. "
+             "Updating the export only copies records added since the last update, unless "
+             "earlier records changed (corrected outcomes, merged patients), which rebuilds it.")
+    
+    col1, col2 = st.columns(2)
+    update = col1.button("Update Export")
+    rebuild = col2.button("Rebuild Export")
+    if update or rebuild:
+        with st.spinner("Exporting records..."):
+            stats = analytics.export_tables(db, full=rebuild)
+        action = "Rebuilt the export with" if stats['rebuilt'] else "Exported"
+        st.success(f"{action} {stats['diabetes_records']} diabetes and {stats['ulcer_records']} ulcer "
+                   f"assessments and {stats['patients']} patients in {stats['seconds']:.1f}s")
+    
+    state_path = os.path.join(analytics.EXPORT_DIR, '_state.json')
+    if not os.path.exists(state_path):
+        st.info("No export yet. Click Update Export to create one.")
     else:
-        report_files = [f for f in os.listdir(reports_dir) if f.endswith('.pdf')]
+        summary, risk, glucose, ulcers = load_population_stats(os.path.getmtime(state_path))
+        
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Patients", f"{summary['patients']:,}")
+        col2.metric("Diabetes Assessments", f"{summary['diabetes_assessments']:,}")
+        col3.metric("High Risk Rate", "-" if summary['high_risk_rate'] is None
+                    else f"{summary['high_risk_rate']:.1%}")
+        col4.metric("Ulcer Prevalence", "-" if summary['ulcer_rate'] is None
+                    else f"{summary['ulcer_rate']:.1%}")
+        
+        st.subheader("Diabetes Risk by Age Band")
+        st.bar_chart(risk.set_index('age_band')['high_risk_rate'])
+        st.dataframe(risk, use_container_width=True)
+        
+        st.subheader("Glucose Distribution (mg/dL)")
+        st.bar_chart(glucose.set_index('glucose_from')['assessments'])
+        
+        st.subheader("Ulcer Prevalence by Month")
+        if len(ulcers):
+            st.line_chart(ulcers.set_index('month')['ulcer_rate'])
+        else:
+            st.write("No ulcer assessments exported yet.")
 
-        if not report_files:
-            st.info("The reports folder is empty.")
+# Metrics Page
+elif page == "Metrics":
+    st.title("Metrics")
+    
+    if not metrics.enabled():
+        st.info("Metrics are disabled. Start the app with DIACARE_METRICS=1 to collect them.")
+    else:
+        snapshot = metrics.snapshot()
+        
+        st.subheader("Operations")
+        if snapshot['operations']:
+            operations = pd.DataFrame.from_dict(snapshot['operations'], orient='index')
+            st.dataframe(operations.round(3), use_container_width=True)
         else:
-            st.subheader("Download Previous Reports")
-            for filename in sorted(report_files, reverse=True):
-                file_path = os.path.join(reports_dir, filename)
-                with open(file_path, "rb") as file:
-                    st.download_button(
-                        label=f"Download: {filename}",
-                        data=file,
-                        file_name=filename,
-                        mime="application/pdf",
-                        key=filename
-                    )
\ No newline at end of file
+            st.write("No operations recorded yet.")
+        
+        st.subheader("Counters")
+        st.json(snapshot['counters'])
+        
+        with st.expander("Prometheus Format"):
+            st.code(metrics.render_prometheus(), language='text')
+        
+        if st.button("Reset Metrics"):
+            metrics.reset()
+            st.success("Metrics cleared.")
+
+# Startup timing - the first full render of this process
+mark('startup:first_render')
+
+with st.sidebar.expander("Startup Timings"):
+    st.json({name: f"{seconds:.3f}s" for name, seconds in timings().items()})
+
+# Load the models in the background once the first page has rendered
+if os.environ.get('DIACARE_WARM_UP', '1') == '1':
+    start_model_warm_up()
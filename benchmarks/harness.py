@@ -0,0 +1,94 @@
+import gc
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+def measure(fn, repeat=100, warmup=3, items_per_call=1):
+    """
+    Time repeat calls of fn after warmup calls
+    Peak Python heap memory comes from one extra call under tracemalloc, so
+    tracing overhead never skews the timings. Native allocations (e.g.
+    TensorFlow's) are not traced
+    Returns latency percentiles in ms, items/sec and peak_memory_mb
+    """
+    for _ in range(warmup):
+        fn()
+
+    gc.collect()
+    seconds = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        seconds[i] = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(seconds * 1000, [50, 95, 99])
+    return {
+        'calls': repeat,
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'throughput': float(repeat * items_per_call / seconds.sum()),
+        'peak_memory_mb': peak / 1e6,
+    }
+
+def measure_once(fn, items):
+    """Time a single long-running call (e.g. a bulk load) of items items"""
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, {
+        'calls': 1,
+        'seconds': seconds,
+        'throughput': items / seconds if seconds > 0 else 0.0,
+        'peak_memory_mb': peak / 1e6,
+    }
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+def save_results(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Regressions against a baseline: p95 latency or peak memory more than
+    tolerance above, or throughput more than tolerance below
+    Returns a list of human-readable regression lines (empty when clean)
+    """
+    regressions = []
+    for name, current in sorted(results['cases'].items()):
+        previous = baseline.get('cases', {}).get(name)
+        if previous is None:
+            continue
+
+        for metric in ('p95_ms', 'peak_memory_mb'):
+            if metric in current and previous.get(metric):
+                change = current[metric] / previous[metric] - 1
+                if change > tolerance:
+                    regressions.append(f"{name}: {metric} {previous[metric]:.3f} -> "
+                                       f"{current[metric]:.3f} (+{change:.0%})")
+
+        if previous.get('throughput'):
+            change = current['throughput'] / previous['throughput'] - 1
+            if change < -tolerance:
+                regressions.append(f"{name}: throughput {previous['throughput']:.1f} -> "
+                                   f"{current['throughput']:.1f} ({change:.0%})")
+
+    return regressions
@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+from benchmarks import synthetic
+from src.models.diabetes_model import FEATURE_COLUMNS
+
+def diabetes_requests(n=1000, seed=0):
+    """JSON bodies for POST /v1/diabetes/predict, one synthetic patient each"""
+    rows = synthetic.diabetes_features(n, seed)[FEATURE_COLUMNS].to_dict('records')
+    return [json.dumps({'features': row}).encode() for row in rows]
+
+def ulcer_images(n=8):
+    return [synthetic.photo_bytes(seed=i) for i in range(n)]
+
+async def run_load(url, endpoint, concurrency, duration, max_requests=None):
+    """
+    concurrency clients send requests back to back for duration seconds (or
+    until max_requests are sent) against a running src.api.server
+    Returns request counts, errors, requests/sec and latency percentiles in ms
+    """
+    import aiohttp
+
+    bodies = diabetes_requests() if endpoint == 'diabetes' else ulcer_images()
+    latencies = []
+    errors = Counter()
+    sent = 0
+    deadline = time.perf_counter() + duration
+
+    async def client(session, offset):
+        nonlocal sent
+        i = offset
+        while time.perf_counter() < deadline and (max_requests is None or sent < max_requests):
+            sent += 1
+            body = bodies[i % len(bodies)]
+            i += concurrency
+            if endpoint == 'diabetes':
+                request = session.post(f"{url}/v1/diabetes/predict", data=body,
+                                       headers={'Content-Type': 'application/json'})
+            else:
+                form = aiohttp.FormData()
+                form.add_field('image', body, filename='foot.jpg', content_type='image/jpeg')
+                request = session.post(f"{url}/v1/ulcer/predict", data=form)
+
+            start = time.perf_counter()
+            try:
+                async with request as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors[str(response.status)] += 1
+                        continue
+            except aiohttp.ClientError as e:
+                errors[type(e).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(session, i) for i in range(concurrency)))
+        seconds = time.perf_counter() - start
+
+    stats = {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': dict(errors),
+        'seconds': seconds,
+        'requests_per_sec': len(latencies) / seconds if seconds > 0 else 0.0,
+    }
+    if latencies:
+        p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+        stats.update({'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)})
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test a running DiaCare REST service')
+    parser.add_argument('--url', default='http://127.0.0.1:8080')
+    parser.add_argument('--endpoint', choices=['diabetes', 'ulcer'], default='diabetes')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32],
+                        help='Client counts to run, one after another')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per run')
+    parser.add_argument('--requests', type=int, help='Stop each run after this many requests')
+    parser.add_argument('--output', help='Write results as JSON')
+    args = parser.parse_args()
+
+    runs = []
+    print(f"{'clients':>8} {'requests':>9} {'errors':>7} {'req/sec':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for concurrency in args.concurrency:
+        stats = asyncio.run(run_load(args.url, args.endpoint, concurrency, args.duration, args.requests))
+        runs.append(stats)
+        print(f"{concurrency:8d} {stats['requests']:9d} {sum(stats['errors'].values()):7d} "
+              f"{stats['requests_per_sec']:10.1f} {stats.get('p50_ms', 0):9.2f} "
+              f"{stats.get('p95_ms', 0):9.2f} {stats.get('p99_ms', 0):9.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'url': args.url, 'runs': runs}, f, indent=2)
+    if any(run['errors'] for run in runs):
+        print(f"Errors: {[run['errors'] for run in runs]}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
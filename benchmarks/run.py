@@ -0,0 +1,184 @@
+import argparse
+import itertools
+import os
+import platform
+import resource
+import sys
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks import synthetic
+from benchmarks.harness import compare, load_results, measure, measure_once, save_results
+
+GROUPS = ['diabetes', 'ulcer', 'database', 'report']
+
+def bench_diabetes(cases, args):
+    from src.models.diabetes_model import FEATURE_COLUMNS, predict_diabetes, predict_diabetes_batch
+
+    if args.real_models:
+        from src.models.loader import load_diabetes_model
+        model = load_diabetes_model(args.diabetes_engine)
+    else:
+        model = synthetic.diabetes_model()
+        if args.diabetes_engine == 'compiled':
+            from src.models.forest_engine import CompiledForest
+            model = CompiledForest.from_sklearn(model)
+
+    data = synthetic.diabetes_features(1000)[FEATURE_COLUMNS]
+    row = data.iloc[0].to_dict()
+    cases['diabetes.predict_single'] = measure(lambda: predict_diabetes(model, row), repeat=200)
+    cases['diabetes.predict_batch_1000'] = measure(lambda: predict_diabetes_batch(model, data),
+                                                   repeat=20, items_per_call=len(data))
+
+def bench_ulcer(cases, args):
+    from src.utils.image_processing import IMAGE_SIZE, preprocess_image, preprocess_images
+
+    photo = synthetic.photo_bytes()
+    cases['ulcer.preprocess'] = measure(lambda: preprocess_image(photo, IMAGE_SIZE), repeat=100)
+
+    try:
+        if args.real_models:
+            from src.models.loader import load_ulcer_model
+            model = load_ulcer_model(args.ulcer_backend)
+        else:
+            model = synthetic.ulcer_model(IMAGE_SIZE)
+    except ImportError as e:
+        print(f"Skipping ulcer.predict: {e}", file=sys.stderr)
+        return
+
+    single = preprocess_image(photo, IMAGE_SIZE)
+    batch = preprocess_images([photo] * 32, IMAGE_SIZE)
+    cases['ulcer.predict_single'] = measure(lambda: model.predict_on_batch(single), repeat=100)
+    cases['ulcer.predict_batch_32'] = measure(lambda: model.predict_on_batch(batch),
+                                              repeat=20, items_per_call=32)
+
+def bench_database(cases, args):
+    from src.database.database_manager import DatabaseManager
+
+    rng = np.random.default_rng(0)
+    sample = next(synthetic.diabetes_assessments(1))
+    data = {field: sample[field] for field in sample
+            if field not in ('name', 'age', 'gender', 'prediction', 'probability')}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'bench.sqlite3'))
+        rows = 0
+
+        # Grow one database through each size, benchmarking at every step
+        for size in sorted(args.sizes):
+            label = f"{size // 1000}k" if size < 1000000 else f"{size // 1000000}m"
+            _, load = measure_once(
+                lambda: db.bulk_add_diabetes_assessments(
+                    synthetic.diabetes_assessments(size - rows, seed=size)),
+                size - rows
+            )
+            cases[f'database.bulk_insert_{label}'] = load
+            rows = size
+
+            cases[f'database.add_assessment_{label}'] = measure(
+                lambda: db.add_diabetes_assessment('Bench Patient', 50, 'Female', data, 1, 75.0),
+                repeat=200
+            )
+
+            patient_ids = itertools.cycle(rng.integers(1, rows + 1, 1000).tolist())
+            cases[f'database.get_patient_records_{label}'] = measure(
+                lambda: db.get_patient_records(next(patient_ids)), repeat=200
+            )
+
+            # The Patient Records page: a count plus the first page of 20
+            def search():
+                db.count_patients('smith')
+                db.search_patients('smith', limit=20)
+            cases[f'database.search_{label}'] = measure(search, repeat=20)
+
+            # The same search as a plain LIKE scan, for comparison with the index
+            has_name_index = db.has_name_index
+            db.has_name_index = False
+            cases[f'database.search_like_{label}'] = measure(search, repeat=20)
+            db.has_name_index = has_name_index
+
+        db.close()
+
+def bench_report(cases, args):
+    from src.utils.report_generator import ReportGenerator
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = os.path.join(tmp, 'foot.jpg')
+        with open(image_path, 'wb') as f:
+            f.write(synthetic.photo_bytes())
+
+        generator = ReportGenerator(os.path.join(tmp, 'reports'))
+        patient = {'name': 'Bench Patient', 'age': 50, 'gender': 'Female'}
+        diabetes = {'prediction': 1, 'probability': 81.5, 'glucose': 160, 'bmi': 33.1,
+                    'blood_pressure': 80}
+        ulcer = {'prediction': 'Ulcer Detected', 'probability': 92.0, 'image_path': image_path}
+
+        cases['report.generate_diabetes'] = measure(
+            lambda: generator.generate_report(patient, diabetes_result=diabetes), repeat=20)
+        cases['report.generate_ulcer'] = measure(
+            lambda: generator.generate_report(patient, ulcer_result=ulcer), repeat=20)
+
+BENCHMARKS = {
+    'diabetes': bench_diabetes,
+    'ulcer': bench_ulcer,
+    'database': bench_database,
+    'report': bench_report,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the DiaCare benchmark suite')
+    parser.add_argument('--only', nargs='+', choices=GROUPS, default=GROUPS)
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000, 1000000],
+                        help='Patient counts for the database benchmarks')
+    parser.add_argument('--real-models', action='store_true',
+                        help='Use the model files in model/ instead of synthetic models')
+    parser.add_argument('--diabetes-engine', choices=['sklearn', 'compiled'], default='sklearn')
+    parser.add_argument('--ulcer-backend', choices=['keras', 'tflite'], default='keras')
+    parser.add_argument('--output', help='Write results as JSON')
+    parser.add_argument('--baseline', help='Compare against this results JSON; exits 1 on regression')
+    parser.add_argument('--save-baseline', help='Write results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    cases = {}
+    for group in args.only:
+        BENCHMARKS[group](cases, args)
+
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        'real_models': args.real_models,
+        # ru_maxrss is KB on Linux, bytes on macOS
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                      / (1e6 if sys.platform == 'darwin' else 1e3),
+        'cases': cases,
+    }
+
+    print(f"{'case':42} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'items/sec':>12} {'peak MB':>9}")
+    for name, case in sorted(cases.items()):
+        if 'p50_ms' in case:
+            print(f"{name:42} {case['p50_ms']:10.3f} {case['p95_ms']:10.3f} {case['p99_ms']:10.3f} "
+                  f"{case['throughput']:12.1f} {case['peak_memory_mb']:9.1f}")
+        else:
+            print(f"{name:42} {'':>10} {'':>10} {'':>10} {case['throughput']:12.1f} "
+                  f"{case['peak_memory_mb']:9.1f}")
+    print(f"Max RSS: {results['max_rss_mb']:.0f} MB")
+
+    if args.output:
+        save_results(results, args.output)
+    if args.save_baseline:
+        save_results(results, args.save_baseline)
+
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import io
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from src.database.database_manager import DIABETES_FIELDS
+from src.models.diabetes_model import FEATURE_COLUMNS
+
+FIRST_NAMES = ['Anvesha', 'Harshita', 'Ravi', 'Priya', 'Arjun', 'Meera', 'John', 'Maria',
+               'Wei', 'Fatima', 'Carlos', 'Aisha', 'Tom', 'Sara', 'Ken', 'Lena']
+LAST_NAMES = ['Srivastava', 'Ojha', 'Sharma', 'Patel', 'Smith', 'Garcia', 'Chen', 'Khan',
+              'Silva', 'Nguyen', 'Brown', 'Kumar', 'Ito', 'Rossi', 'Singh', 'Miller']
+
+def diabetes_features(n, seed=0):
+    """n rows shaped like data/diabetes.csv (FEATURE_COLUMNS plus Outcome)"""
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame({
+        'Pregnancies': rng.integers(0, 15, n),
+        'Glucose': rng.normal(120, 30, n).clip(40, 250).round(),
+        'BloodPressure': rng.normal(70, 12, n).clip(30, 130).round(),
+        'SkinThickness': rng.integers(0, 60, n),
+        'Insulin': rng.integers(0, 400, n),
+        'BMI': rng.normal(32, 7, n).clip(15, 60).round(1),
+        'DiabetesPedigreeFunction': rng.gamma(2.0, 0.25, n).round(3),
+        'Age': rng.integers(21, 80, n),
+    })[FEATURE_COLUMNS]
+    risk = (data['Glucose'] - 120) / 30 + (data['BMI'] - 32) / 7 + rng.normal(0, 1, n)
+    data['Outcome'] = (risk > 0.8).astype(int)
+    return data
+
+def diabetes_model(n_estimators=100, seed=0):
+    """RandomForest fitted on synthetic rows, standing in for model/diabetes_model.pkl"""
+    from sklearn.ensemble import RandomForestClassifier
+
+    data = diabetes_features(768, seed)
+    model = RandomForestClassifier(n_estimators=n_estimators, random_state=seed)
+    return model.fit(data[FEATURE_COLUMNS], data['Outcome'])
+
+def ulcer_model(image_size):
+    """Untrained CNN with the ulcer model's architecture at image_size"""
+    from src.models.ulcer_model import create_ulcer_model
+    return create_ulcer_model((image_size[1], image_size[0], 3))
+
+def photo_bytes(width=1280, height=960, seed=0, image_format='JPEG'):
+    """Encoded noise image, sized like a phone photo"""
+    rng = np.random.default_rng(seed)
+    # Smooth noise compresses like a photo rather than like static
+    small = rng.integers(0, 256, (height // 16, width // 16, 3), dtype=np.uint8)
+    img = Image.fromarray(small).resize((width, height), Image.BILINEAR)
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format, quality=90)
+    return buffer.getvalue()
+
+def patient_names(n, seed=0):
+    rng = np.random.default_rng(seed)
+    first = rng.choice(FIRST_NAMES, n)
+    last = rng.choice(LAST_NAMES, n)
+    return [f"{a} {b}" for a, b in zip(first, last)]
+
+def diabetes_assessments(n, seed=0):
+    """Dicts for DatabaseManager.bulk_add_diabetes_assessments, generated lazily"""
+    rng = np.random.default_rng(seed)
+    names = patient_names(n, seed)
+    ages = rng.integers(18, 90, n)
+    genders = rng.choice(['Male', 'Female', 'Other'], n)
+    values = rng.random((n, len(DIABETES_FIELDS))) * 100
+    predictions = rng.integers(0, 2, n)
+    probabilities = rng.random(n) * 50 + 50
+
+    for i in range(n):
+        assessment = dict(zip(DIABETES_FIELDS, values[i].tolist()))
+        assessment.update({
+            'name': names[i],
+            'age': int(ages[i]),
+            'gender': str(genders[i]),
+            'prediction': int(predictions[i]),
+            'probability': float(probabilities[i]),
+        })
+        yield assessment
@@ -1,87 +1,76 @@
-import sqlite3
-from datetime import datetime
-import os
+"""
+Legacy interface kept for old imports. Storage goes through
+src.database.database_manager.DatabaseManager, whose migrations own the schema;
+importing this module no longer touches the database
+"""
+import threading
+
+from src.database.database_manager import DIABETES_FIELDS, DatabaseManager
 
 DB_FILE = "diacare_db.sqlite3"
 
+_manager = None
+_lock = threading.Lock()
+
+# Rows in the old denormalized layout, read from the normalized tables
+LEGACY_QUERIES = {
+    'diabetes_records': '''
+        SELECT r.id, p.name, p.age, r.glucose, r.blood_pressure, r.bmi,
+               r.diabetes_pedigree, r.prediction, r.probability AS confidence,
+               r.created_at AS timestamp
+        FROM diabetes_records r JOIN patients p ON p.id = r.patient_id
+        ORDER BY r.id DESC
+    ''',
+    'foot_ulcer_records': '''
+        SELECT r.id, p.name, p.age, r.image_path,
+               CASE r.prediction WHEN 'Ulcer Detected' THEN 1 ELSE 0 END AS prediction,
+               r.probability AS confidence, r.created_at AS timestamp
+        FROM ulcer_records r JOIN patients p ON p.id = r.patient_id
+        ORDER BY r.id DESC
+    ''',
+}
+
+# Get the shared manager, opened (and migrated) on first use
+def get_manager():
+    global _manager
+    with _lock:
+        if _manager is None:
+            _manager = DatabaseManager(DB_FILE)
+        return _manager
+
 # Get connection
 def get_connection():
-    return sqlite3.connect(DB_FILE)
+    return get_manager().pool.connection()
 
-# Create tables if not exist
+# Kept for old callers; the schema is created by the migrations
 def create_tables():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS diabetes_records (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            age INTEGER,
-            glucose REAL,
-            blood_pressure REAL,
-            bmi REAL,
-            diabetes_pedigree REAL,
-            prediction INTEGER,
-            confidence REAL,
-            timestamp TEXT
-        )
-    """)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS foot_ulcer_records (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            age INTEGER,
-            image_path TEXT,
-            prediction INTEGER,
-            confidence REAL,
-            timestamp TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+    get_manager()
 
 # Insert diabetes record
 def insert_diabetes_record(data):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO diabetes_records
-        (name, age, glucose, blood_pressure, bmi, diabetes_pedigree, prediction, confidence, timestamp)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        data['name'], data['age'], data['glucose'], data['blood_pressure'],
-        data['bmi'], data['diabetes_pedigree'], data['prediction'],
-        data['confidence'], datetime.now().isoformat()
-    ))
-    conn.commit()
-    conn.close()
+    fields = {field: data.get(field) for field in DIABETES_FIELDS}
+    _, record_id = get_manager().add_diabetes_assessment(
+        data['name'], data['age'], data.get('gender'), fields,
+        data['prediction'], data['confidence']
+    )
+    return record_id
 
 # Insert foot ulcer record
 def insert_foot_ulcer_record(data):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO foot_ulcer_records
-        (name, age, image_path, prediction, confidence, timestamp)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (
-        data['name'], data['age'], data['image_path'],
-        data['prediction'], data['confidence'], datetime.now().isoformat()
-    ))
-    conn.commit()
-    conn.close()
+    prediction = data['prediction']
+    if not isinstance(prediction, str):
+        prediction = "Ulcer Detected" if prediction == 1 else "Normal"
+    _, record_id = get_manager().add_ulcer_assessment(
+        data['name'], data['age'], data.get('gender'), data['image_path'],
+        prediction, data['confidence']
+    )
+    return record_id
 
 # Fetch records
 def fetch_records(table_name):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(f"SELECT * FROM {table_name} ORDER BY id DESC")
-    records = cur.fetchall()
-    conn.close()
-    return records
-
-# Initialize the database tables on import
-create_tables()
+    if table_name not in LEGACY_QUERIES:
+        raise ValueError(f"Unknown table {table_name!r}")
+    return [tuple(row) for row in get_connection().execute(LEGACY_QUERIES[table_name])]
 
 # Export a helper class for easy import in app.py
 class DatabaseModule:
@@ -90,8 +79,8 @@ class DatabaseModule:
     
     def insert_diabetes_record(self, data):
         return insert_diabetes_record(data)
-        
+    
     def insert_foot_ulcer_record(self, data):
         return insert_foot_ulcer_record(data)
 
-database = DatabaseModule()
\ No newline at end of file
+database = DatabaseModule()
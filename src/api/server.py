@@ -0,0 +1,383 @@
+import asyncio
+import functools
+import json
+import os
+import signal
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from aiohttp import web
+
+from src.database.database_manager import DIABETES_FIELDS, DatabaseManager
+from src.models.diabetes_model import FEATURE_COLUMNS, predict_diabetes_batch
+from src.models.inference_server import BatchingPredictor
+from src.models.loader import TFLITE_ULCER_MODEL_PATH, load_diabetes_model, load_ulcer_model
+from src.models.ulcer_model import interpret_ulcer_prediction
+from src.utils import metrics
+from src.utils.image_processing import IMAGE_SIZE, preprocess_images
+from src.utils.image_store import IMAGE_STORE_DIR, ImageStore
+
+def default_config():
+    """Service settings, from the same environment variables as app.py"""
+    ulcer_options = {'backend': os.environ.get('DIACARE_ULCER_BACKEND', 'keras')}
+    if ulcer_options['backend'] == 'tflite':
+        ulcer_options['tflite_path'] = os.environ.get('DIACARE_TFLITE_MODEL', TFLITE_ULCER_MODEL_PATH)
+        if os.environ.get('DIACARE_TFLITE_THREADS'):
+            ulcer_options['num_threads'] = int(os.environ['DIACARE_TFLITE_THREADS'])
+    return {
+        'db_path': 'diacare_db.sqlite3',
+        'image_store': IMAGE_STORE_DIR,
+        'diabetes_engine': os.environ.get('DIACARE_DIABETES_ENGINE', 'sklearn'),
+        'ulcer_options': ulcer_options,
+        'load_ulcer': True,
+        # Threads per worker for preprocessing, SQLite and the batchers' callers
+        'threads': min(8, os.cpu_count() or 1),
+        'max_wait_ms': 5,
+        'max_body_mb': 32,
+    }
+
+class DiabetesBatchModel:
+    """predict_diabetes_batch behind the predict_on_batch interface of BatchingPredictor"""
+    def __init__(self, model):
+        self.model = model
+
+    def predict_on_batch(self, rows):
+        result = predict_diabetes_batch(self.model, rows)
+        return np.column_stack([result['prediction'], result['probability']])
+
+def _error(exception_class, message):
+    return exception_class(text=json.dumps({'error': message}), content_type='application/json')
+
+def _json_response(data, status=200):
+    return web.json_response(data, status=status, dumps=functools.partial(json.dumps, default=str))
+
+@web.middleware
+async def _observe(request, handler):
+    # One latency histogram per route; errors are counted by the span
+    route = request.match_info.route.name or 'unmatched'
+    with metrics.span(f'api.{route}'):
+        return await handler(request)
+
+class InferenceService:
+    """
+    JSON/multipart endpoints over the diabetes model, the ulcer model and
+    DatabaseManager, for one worker process
+    Blocking work (decoding, SQLite, the image store) runs on a thread pool;
+    inference goes through BatchingPredictors, so concurrent requests share
+    forward passes instead of queueing for the model one by one
+    """
+    def __init__(self, config):
+        self.config = config
+        self.executor = None
+        self.db = None
+        self.store = None
+        self.diabetes_predictor = None
+        self.ulcer_predictor = None
+        self._ulcer_ready = None
+
+    def routes(self):
+        return [
+            web.get('/health', self.health, name='health'),
+            web.get('/metrics', self.metrics, name='metrics'),
+            web.post('/v1/diabetes/predict', self.predict_diabetes, name='diabetes_predict'),
+            web.put(r'/v1/diabetes/records/{record_id:\d+}/outcome', self.set_diabetes_outcome,
+                    name='diabetes_outcome'),
+            web.post('/v1/ulcer/predict', self.predict_ulcer, name='ulcer_predict'),
+            web.get('/v1/patients', self.search_patients, name='patients'),
+            web.get(r'/v1/patients/{patient_id:\d+}', self.patient_records, name='patient_records'),
+        ]
+
+    async def start(self, app):
+        loop = asyncio.get_running_loop()
+        self.executor = ThreadPoolExecutor(max_workers=self.config['threads'],
+                                           thread_name_prefix='api-worker')
+        self.db = DatabaseManager(self.config['db_path'])
+        self.store = ImageStore(os.path.abspath(self.config['image_store']))
+
+        # Preloaded by serve() before the workers were forked, so this is a lookup
+        model = load_diabetes_model(self.config['diabetes_engine'])
+        self.diabetes_predictor = BatchingPredictor(DiabetesBatchModel(model), max_batch_size=256,
+                                                    max_wait_ms=self.config['max_wait_ms'],
+                                                    name='diabetes', input_shape=(len(FEATURE_COLUMNS),))
+
+        # TensorFlow does not survive fork, so each worker loads the ulcer
+        # model itself, in the background; its endpoint waits for it
+        if self.config['load_ulcer']:
+            self._ulcer_ready = loop.run_in_executor(self.executor, self._load_ulcer)
+
+    def _load_ulcer(self):
+        model = load_ulcer_model(**self.config['ulcer_options'])
+        self.ulcer_predictor = BatchingPredictor(model, max_batch_size=32,
+                                                 max_wait_ms=self.config['max_wait_ms'])
+
+    async def stop(self, app):
+        for predictor in (self.diabetes_predictor, self.ulcer_predictor):
+            if predictor is not None:
+                predictor.close()
+        self.executor.shutdown(wait=True)
+        self.db.close()
+
+    async def run(self, fn, *args):
+        """Run a blocking call on the worker's thread pool"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(fn, *args))
+
+    async def health(self, request):
+        if self._ulcer_ready is None:
+            ulcer = 'disabled'
+        elif not self._ulcer_ready.done():
+            ulcer = 'loading'
+        else:
+            ulcer = 'unavailable' if self._ulcer_ready.exception() else 'ready'
+        batching = {'diabetes': self.diabetes_predictor.metrics()}
+        if self.ulcer_predictor is not None:
+            batching['ulcer'] = self.ulcer_predictor.metrics()
+        return _json_response({
+            'status': 'ok',
+            'pid': os.getpid(),
+            'diabetes_engine': self.config['diabetes_engine'],
+            'ulcer_model': ulcer,
+            'batching': batching,
+        })
+
+    async def metrics(self, request):
+        # Per worker process: each scrape sees the worker that accepted it
+        return web.Response(text=metrics.render_prometheus(), content_type='text/plain')
+
+    async def predict_diabetes(self, request):
+        """
+        Body: {"features": {FEATURE_COLUMNS...}, "patient": {"name", "gender"}}
+        or {"instances": [such objects, ...]}. With a patient the assessment is
+        saved, aged by the Age feature, and patient_id/record_id are returned
+        """
+        try:
+            body = await request.json()
+        except ValueError:
+            raise _error(web.HTTPBadRequest, "Body must be JSON")
+        if not isinstance(body, dict):
+            raise _error(web.HTTPBadRequest, "Body must be a JSON object")
+        single = 'instances' not in body
+        instances = [body] if single else body['instances']
+        if not isinstance(instances, list) or not instances:
+            raise _error(web.HTTPBadRequest, "instances must be a non-empty list")
+        if not all(isinstance(instance, dict) for instance in instances):
+            raise _error(web.HTTPBadRequest, "Each instance must be a JSON object")
+
+        try:
+            rows = np.array([[float(instance['features'][column]) for column in FEATURE_COLUMNS]
+                             for instance in instances], dtype=np.float64)
+        except (KeyError, TypeError, ValueError) as e:
+            raise _error(web.HTTPBadRequest, f"Each instance needs numeric features {FEATURE_COLUMNS}: {e}")
+        # float() also accepts "nan" and "inf"
+        if not np.isfinite(rows).all():
+            raise _error(web.HTTPBadRequest, "Feature values must be finite numbers")
+        for instance in instances:
+            patient = instance.get('patient')
+            if patient is not None and not (isinstance(patient, dict) and patient.get('name')):
+                raise _error(web.HTTPBadRequest, "patient needs a name")
+
+        outputs = await asyncio.wrap_future(self.diabetes_predictor.submit(rows))
+        results = [{
+            'prediction': int(prediction),
+            'risk': 'High' if prediction == 1 else 'Low',
+            'probability': float(probability),
+        } for prediction, probability in outputs]
+
+        if any(instance.get('patient') for instance in instances):
+            await self.run(self._save_diabetes, instances, rows, results)
+        return _json_response(results[0] if single else {'results': results})
+
+    def _save_diabetes(self, instances, rows, results):
+        with self.db.pool.transaction():
+            for instance, row, result in zip(instances, rows, results):
+                patient = instance.get('patient')
+                if not patient:
+                    continue
+                data = dict(zip(DIABETES_FIELDS, row[:len(DIABETES_FIELDS)].tolist()))
+                result['patient_id'], result['record_id'] = self.db.add_diabetes_assessment(
+                    patient['name'], int(row[FEATURE_COLUMNS.index('Age')]), patient.get('gender'),
+                    data, result['prediction'], result['probability']
+                )
+
+    async def set_diabetes_outcome(self, request):
+        """
+        Body: {"outcome": 0 | 1 | null}, the confirmed diagnosis for a saved
+        assessment. Confirmed records are training data for src.models.training
+        """
+        try:
+            body = await request.json()
+        except ValueError:
+            raise _error(web.HTTPBadRequest, "Body must be JSON")
+        if (not isinstance(body, dict) or body.get('outcome', -1) not in (0, 1, None)
+                or isinstance(body['outcome'], bool)):
+            raise _error(web.HTTPBadRequest, 'Body must be {"outcome": 0, 1 or null}')
+        outcome = body['outcome'] if body['outcome'] is None else int(body['outcome'])
+
+        record_id = int(request.match_info['record_id'])
+        if not await self.run(self.db.set_diabetes_outcome, record_id, outcome):
+            raise _error(web.HTTPNotFound, "No such diabetes record")
+        return _json_response({'record_id': record_id, 'outcome': outcome})
+
+    async def predict_ulcer(self, request):
+        """
+        multipart/form-data with one or more 'image' files. With a 'name' field
+        (and optionally 'age', 'gender') the images are stored and the results
+        saved for that patient, returning patient_id/record_ids
+        """
+        if self._ulcer_ready is None:
+            raise _error(web.HTTPServiceUnavailable, "Ulcer model is disabled on this server")
+        try:
+            await self._ulcer_ready
+        except Exception as e:
+            raise _error(web.HTTPServiceUnavailable, f"Ulcer model unavailable: {e}")
+
+        try:
+            form = await request.post()
+        except ValueError:
+            raise _error(web.HTTPBadRequest, "Body must be multipart/form-data")
+        files = [f for f in form.getall('image', []) if isinstance(f, web.FileField)]
+        if not files:
+            raise _error(web.HTTPBadRequest, "Upload at least one 'image' file")
+        images = [(f.filename, f.file.read()) for f in files]
+
+        try:
+            batch = await self.run(preprocess_images, [data for _, data in images], IMAGE_SIZE)
+        except OSError as e:
+            raise _error(web.HTTPBadRequest, f"Could not decode image: {e}")
+        outputs = await asyncio.wrap_future(self.ulcer_predictor.submit(batch))
+        results = [dict(interpret_ulcer_prediction(row), file=file_name)
+                   for (file_name, _), row in zip(images, outputs)]
+
+        response = {'results': results}
+        if form.get('name'):
+            try:
+                age = int(form['age']) if form.get('age') else None
+            except ValueError:
+                raise _error(web.HTTPBadRequest, "age must be an integer")
+            response['patient_id'], response['record_ids'] = await self.run(
+                self._save_ulcer, form['name'], age, form.get('gender'), images, results)
+        return _json_response(response)
+
+    def _save_ulcer(self, name, age, gender, images, results):
+        for (_, data), result in zip(images, results):
+            result['image_path'] = self.store.put(data)
+        return self.db.add_ulcer_batch(name, age, gender, results)
+
+    async def search_patients(self, request):
+        """?name=<substring>&limit=20&offset=0"""
+        name = request.query.get('name', '')
+        try:
+            limit = min(int(request.query.get('limit', 20)), 100)
+            offset = int(request.query.get('offset', 0))
+        except ValueError:
+            raise _error(web.HTTPBadRequest, "limit and offset must be integers")
+
+        def search():
+            return self.db.count_patients(name), self.db.search_patients(name, limit, offset)
+        total, patients = await self.run(search)
+        return _json_response({'total': total, 'patients': patients})
+
+    async def patient_records(self, request):
+        records = await self.run(self.db.get_patient_records, int(request.match_info['patient_id']))
+        if records is None:
+            raise _error(web.HTTPNotFound, "No such patient")
+        return _json_response(records)
+
+def create_app(config=None):
+    config = config or default_config()
+    service = InferenceService(config)
+    app = web.Application(middlewares=[_observe], client_max_size=config['max_body_mb'] * 1024 * 1024)
+    app.add_routes(service.routes())
+    app.on_startup.append(service.start)
+    app.on_cleanup.append(service.stop)
+    return app
+
+def run_worker(sock, config):
+    web.run_app(create_app(config), sock=sock, print=None, access_log=None)
+
+def serve(config, host='127.0.0.1', port=8080, workers=1):
+    """
+    Serve on host:port with workers processes sharing one listening socket
+    The diabetes model is loaded and the schema migrated once, in this
+    process, before forking: workers share the model's memory copy-on-write
+    instead of each loading the file. Workers that die are restarted
+    """
+    load_diabetes_model(config['diabetes_engine'])
+    DatabaseManager(config['db_path']).close()
+
+    sock = socket.create_server((host, port), backlog=1024)
+    sock.set_inheritable(True)
+    print(f"Serving on http://{host}:{port} with {workers} worker(s)")
+
+    # fork is POSIX-only; elsewhere this process is the single worker
+    if workers <= 1 or not hasattr(os, 'fork'):
+        run_worker(sock, config)
+        return
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            try:
+                run_worker(sock, config)
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for _ in range(workers):
+        spawn()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited ({status}); restarting")
+            time.sleep(1)
+            spawn()
+    sock.close()
+
+if __name__ == '__main__':
+    import argparse
+
+    defaults = default_config()
+    parser = argparse.ArgumentParser(description='REST inference service for DiaCare models')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes (forked after preload)')
+    parser.add_argument('--threads', type=int, default=defaults['threads'], help='Thread pool size per worker')
+    parser.add_argument('--db', default=defaults['db_path'])
+    parser.add_argument('--image-store', default=defaults['image_store'])
+    parser.add_argument('--diabetes-engine', choices=['sklearn', 'compiled'], default=defaults['diabetes_engine'])
+    parser.add_argument('--no-ulcer', action='store_true', help="Don't load the ulcer model")
+    parser.add_argument('--max-wait-ms', type=float, default=defaults['max_wait_ms'],
+                        help='How long a batcher waits to fill a batch')
+    args = parser.parse_args()
+
+    defaults.update({
+        'db_path': args.db,
+        'image_store': args.image_store,
+        'diabetes_engine': args.diabetes_engine,
+        'load_ulcer': not args.no_ulcer,
+        'threads': args.threads,
+        'max_wait_ms': args.max_wait_ms,
+    })
+    serve(defaults, args.host, args.port, args.workers)
@@ -0,0 +1,309 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: exports are only serialized within a process
+    fcntl = None
+
+EXPORT_DIR = 'analytics'
+
+AGE_BANDS = [0, 30, 40, 50, 60, 70, 200]
+AGE_LABELS = ['<30', '30-39', '40-49', '50-59', '60-69', '70+']
+
+# Age when the record was taken; patients.age is their latest age
+_AGE_AT_RECORD = 'COALESCE(CAST(substr(r.created_at, 1, 4) AS INTEGER) - p.birth_year, p.age) AS age'
+
+# Columns exported per table; patient names stay out of the analytics copy
+EXPORTS = {
+    'patients': '''
+        SELECT p.id, p.age, p.gender, p.created_at
+        FROM patients p
+    ''',
+    'diabetes_records': f'''
+        SELECT r.id, r.patient_id, {_AGE_AT_RECORD}, p.gender, r.pregnancies, r.glucose,
+               r.blood_pressure, r.skin_thickness, r.insulin, r.bmi,
+               r.diabetes_pedigree, r.prediction, r.probability, r.outcome, r.created_at
+        FROM diabetes_records r LEFT JOIN patients p ON p.id = r.patient_id
+    ''',
+    'ulcer_records': f'''
+        SELECT r.id, r.patient_id, {_AGE_AT_RECORD}, p.gender, r.prediction, r.probability, r.created_at
+        FROM ulcer_records r LEFT JOIN patients p ON p.id = r.patient_id
+    ''',
+}
+
+# Aggregates over the exported rows, recorded with each watermark. If they
+# change, rows behind the watermark were updated, deleted (e.g. merged
+# duplicates) or inserted late (e.g. migrated legacy records) and the export
+# is rebuilt instead of appended to
+FINGERPRINTS = {
+    'patients': 'COUNT(*), MAX(rowid), TOTAL(id * age), TOTAL(id * length(gender))',
+    'diabetes_records': 'COUNT(*), COUNT(outcome), TOTAL(outcome), TOTAL(patient_id)',
+    'ulcer_records': 'COUNT(*), TOTAL(patient_id)',
+}
+
+def _schema(table):
+    import pyarrow as pa
+
+    common = [('id', pa.int64()), ('age', pa.int64()), ('gender', pa.string())]
+    schemas = {
+        'patients': common,
+        'diabetes_records': common + [
+            ('patient_id', pa.int64()), ('pregnancies', pa.float64()), ('glucose', pa.float64()),
+            ('blood_pressure', pa.float64()), ('skin_thickness', pa.float64()),
+            ('insulin', pa.float64()), ('bmi', pa.float64()), ('diabetes_pedigree', pa.float64()),
+            ('prediction', pa.int64()), ('probability', pa.float64()), ('outcome', pa.int64()),
+        ],
+        'ulcer_records': common + [
+            ('patient_id', pa.int64()), ('prediction', pa.string()), ('probability', pa.float64()),
+        ],
+    }
+    fields = schemas[table] + [('created_at', pa.timestamp('s')), ('created_month', pa.string())]
+    return pa.schema(fields)
+
+def _load_state(export_dir):
+    path = os.path.join(export_dir, '_state.json')
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+def _save_state(export_dir, state):
+    path = os.path.join(export_dir, '_state.json')
+    fd, tmp_path = tempfile.mkstemp(dir=export_dir, prefix='_state.json.', suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+_export_lock = threading.Lock()
+
+@contextmanager
+def _exclusive(export_dir):
+    # One export at a time: the thread lock covers sessions of this process,
+    # the lock file other processes. It sits next to export_dir rather than
+    # inside it, since a rebuild swaps the directory out
+    with _export_lock:
+        os.makedirs(export_dir, exist_ok=True)
+        with open(f"{export_dir.rstrip(os.sep)}.lock", 'w') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+def _fingerprint(conn, table, watermark):
+    row = conn.execute(f'''
+        SELECT {FINGERPRINTS[table]} FROM {table} WHERE (created_at, id) <= (?, ?)
+    ''', (watermark['created_at'], watermark['id'])).fetchone()
+    return [float(value) for value in row]
+
+def stale_reason(conn, export_dir=EXPORT_DIR):
+    """Why the export in export_dir can no longer be appended to, or None"""
+    from src.database.migrations import schema_version
+
+    state = _load_state(export_dir)
+    if not state:
+        return None
+    if state.get('schema_version') != schema_version(conn):
+        return 'schema version changed'
+    for table in EXPORTS:
+        if table in state and _fingerprint(conn, table, state[table]) != state[table].get('fingerprint'):
+            return f"{table} changed behind the watermark"
+    return None
+
+def _swap_dir(new_dir, export_dir):
+    # Two renames, so readers see either the old or the new export (or, for
+    # an instant, none) but never a half-written one
+    old_dir = f"{export_dir}.old-{uuid.uuid4().hex[:8]}"
+    if os.path.isdir(export_dir):
+        os.rename(export_dir, old_dir)
+    os.rename(new_dir, export_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+def export_tables(db, export_dir=EXPORT_DIR, chunksize=100000, tables=tuple(EXPORTS), full=False):
+    """
+    Stream the tables into Parquet under export_dir/<table>/created_month=YYYY-MM/
+    Incremental: only rows after the last exported (created_at, id) are read,
+    so each run appends new part files. Rows are streamed chunksize at a time
+    With full=True, or when stale_reason() finds the export out of date, every
+    table is exported again into a new directory that then replaces export_dir
+    Exports of the same export_dir run one at a time, so concurrent runs
+    never read the same watermark and append the same rows twice
+    Returns {table: rows exported}, plus 'rebuilt' and 'seconds'
+    """
+    start = time.perf_counter()
+    with _exclusive(export_dir):
+        stats = _export_tables(db, export_dir, chunksize, tables, full)
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+def _export_tables(db, export_dir, chunksize, tables, full):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from src.database.migrations import schema_version
+
+    conn = db.pool.connection()
+    os.makedirs(export_dir, exist_ok=True)
+    run_id = uuid.uuid4().hex[:8]
+    full = full or stale_reason(conn, export_dir) is not None
+
+    if full:
+        target_dir = f"{export_dir.rstrip(os.sep)}.rebuild-{run_id}"
+        os.makedirs(target_dir)
+        state = {}
+        tables = tuple(EXPORTS)
+    else:
+        target_dir = export_dir
+        state = _load_state(export_dir)
+    state['schema_version'] = schema_version(conn)
+    stats = {}
+
+    try:
+        for table in tables:
+            alias = 'p' if table == 'patients' else 'r'
+            watermark = state.get(table, {'created_at': '', 'id': 0})
+            sql = f'''
+                {EXPORTS[table]}
+                WHERE ({alias}.created_at, {alias}.id) > (?, ?)
+                ORDER BY {alias}.created_at, {alias}.id
+            '''
+            schema = _schema(table)
+            rows = 0
+
+            chunks = pd.read_sql_query(sql, conn, chunksize=chunksize,
+                                       params=(watermark['created_at'], watermark['id']))
+            for i, chunk in enumerate(chunks):
+                if chunk.empty:
+                    continue
+                last = chunk.iloc[-1]
+                watermark = {'created_at': last['created_at'], 'id': int(last['id'])}
+
+                chunk['created_at'] = pd.to_datetime(chunk['created_at'])
+                chunk['created_month'] = chunk['created_at'].dt.strftime('%Y-%m')
+                pq.write_to_dataset(
+                    pa.Table.from_pandas(chunk, schema=schema, preserve_index=False),
+                    os.path.join(target_dir, table),
+                    partition_cols=['created_month'],
+                    basename_template=f"part-{run_id}-{i}-{{i}}.parquet",
+                    existing_data_behavior='overwrite_or_ignore',
+                )
+                rows += len(chunk)
+
+            # Committed after each table, so a failed incremental run resumes where it stopped
+            state[table] = dict(watermark, fingerprint=_fingerprint(conn, table, watermark))
+            _save_state(target_dir, state)
+            stats[table] = rows
+    except BaseException:
+        if full:
+            shutil.rmtree(target_dir, ignore_errors=True)
+        raise
+
+    if full:
+        _swap_dir(target_dir, export_dir)
+    stats['rebuilt'] = full
+    return stats
+
+def load_columns(table, columns, export_dir=EXPORT_DIR):
+    """Only the given columns of an exported table, as a pyarrow Table"""
+    import pyarrow.dataset as ds
+
+    path = os.path.join(export_dir, table)
+    if not os.path.isdir(path):
+        return None
+    dataset = ds.dataset(path, format='parquet', partitioning='hive', schema=_schema(table))
+    return dataset.to_table(columns=columns)
+
+def risk_by_age_band(export_dir=EXPORT_DIR):
+    """Diabetes assessments per age band with the share predicted high risk"""
+    data = load_columns('diabetes_records', ['age', 'prediction', 'probability'], export_dir)
+    if data is None or not data.num_rows:
+        return pd.DataFrame(columns=['age_band', 'assessments', 'high_risk_rate', 'mean_confidence'])
+
+    age = data.column('age').to_numpy(zero_copy_only=False).astype(np.float64)
+    known = ~np.isnan(age)
+    prediction = data.column('prediction').to_numpy(zero_copy_only=False)[known]
+    probability = data.column('probability').to_numpy(zero_copy_only=False)[known]
+    band = np.digitize(age[known], AGE_BANDS[1:-1])
+
+    counts = np.bincount(band, minlength=len(AGE_LABELS))
+    high_risk = np.bincount(band, weights=(prediction == 1), minlength=len(AGE_LABELS))
+    confidence = np.bincount(band, weights=probability, minlength=len(AGE_LABELS))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return pd.DataFrame({
+            'age_band': AGE_LABELS,
+            'assessments': counts,
+            'high_risk_rate': high_risk / counts,
+            'mean_confidence': confidence / counts,
+        })
+
+def glucose_distribution(bins=range(0, 310, 10), export_dir=EXPORT_DIR):
+    """Histogram of assessed glucose levels (mg/dL)"""
+    data = load_columns('diabetes_records', ['glucose'], export_dir)
+    glucose = np.array([]) if data is None else data.column('glucose').to_numpy(zero_copy_only=False)
+    counts, edges = np.histogram(glucose[~np.isnan(glucose)], bins=list(bins))
+    return pd.DataFrame({'glucose_from': edges[:-1].astype(int), 'assessments': counts})
+
+def ulcer_prevalence_by_month(export_dir=EXPORT_DIR):
+    """Ulcer assessments per month with the share where an ulcer was detected"""
+    data = load_columns('ulcer_records', ['created_month', 'prediction'], export_dir)
+    if data is None or not data.num_rows:
+        return pd.DataFrame(columns=['month', 'assessments', 'ulcer_rate'])
+
+    import pyarrow.compute as pc
+
+    data = data.append_column('ulcer', pc.cast(pc.equal(data.column('prediction'), 'Ulcer Detected'), 'int64'))
+    grouped = data.group_by('created_month').aggregate([('ulcer', 'count'), ('ulcer', 'mean')])
+    result = grouped.to_pandas().rename(columns={
+        'created_month': 'month', 'ulcer_count': 'assessments', 'ulcer_mean': 'ulcer_rate'
+    })
+    return result.sort_values('month').reset_index(drop=True)
+
+def population_summary(export_dir=EXPORT_DIR):
+    """Headline counts and rates over everything exported"""
+    patients = load_columns('patients', ['id'], export_dir)
+    diabetes = load_columns('diabetes_records', ['prediction'], export_dir)
+    ulcers = load_columns('ulcer_records', ['prediction'], export_dir)
+
+    import pyarrow.compute as pc
+
+    def rate(table, value):
+        if table is None or not table.num_rows:
+            return None
+        return pc.sum(pc.equal(table.column('prediction'), value)).as_py() / table.num_rows
+
+    return {
+        'patients': 0 if patients is None else patients.num_rows,
+        'diabetes_assessments': 0 if diabetes is None else diabetes.num_rows,
+        'ulcer_assessments': 0 if ulcers is None else ulcers.num_rows,
+        'high_risk_rate': rate(diabetes, 1),
+        'ulcer_rate': rate(ulcers, 'Ulcer Detected'),
+    }
+
+if __name__ == '__main__':
+    import argparse
+    from src.database.database_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description='Export assessment history to partitioned Parquet')
+    parser.add_argument('--db', default='diacare_db.sqlite3')
+    parser.add_argument('--output-dir', default=EXPORT_DIR)
+    parser.add_argument('--chunksize', type=int, default=100000)
+    parser.add_argument('--full', action='store_true',
+                        help='Rebuild the whole export, e.g. after outcomes were corrected')
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.db)
+    stats = export_tables(db, args.output_dir, args.chunksize, full=args.full)
+    db.close()
+
+    seconds = stats.pop('seconds')
+    action = 'rows' if stats.pop('rebuilt') else 'new rows'
+    print(', '.join(f"{table}: {rows} {action}" for table, rows in stats.items())
+          + f" ({seconds:.2f}s)")
+    print(json.dumps(population_summary(args.output_dir), indent=2))
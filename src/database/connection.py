@@ -0,0 +1,88 @@
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+
+class _ThreadConnection:
+    # Lives only in the pool's thread-local storage, which Python clears when
+    # the thread exits; its finalizer then closes the connection
+    def __init__(self, conn):
+        self.conn = conn
+        self.depth = 0
+
+class ConnectionPool:
+    """
+    Per-thread persistent SQLite connections for one database file
+    Each thread reuses its own connection, opened in WAL mode with tuned pragmas,
+    so concurrent Streamlit sessions don't pay connect cost or block readers on writes
+    A thread's connection is closed when the thread exits, so short-lived threads
+    (one per Streamlit rerun) don't accumulate open connections
+    """
+    def __init__(self, db_path, busy_timeout=5.0, cache_size_kb=20000):
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.cache_size_kb = cache_size_kb
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = set()
+
+    def _connect(self):
+        # isolation_level=None: transactions are opened explicitly in transaction()
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout,
+                               isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{int(self.cache_size_kb)}')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout * 1000)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+
+        with self._lock:
+            self._connections.add(conn)
+        return conn
+
+    def _release(self, conn):
+        with self._lock:
+            self._connections.discard(conn)
+        conn.close()
+
+    def _thread_connection(self):
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            state = self._local.state = _ThreadConnection(self._connect())
+            weakref.finalize(state, self._release, state.conn)
+        return state
+
+    def connection(self):
+        return self._thread_connection().conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run the block in one write transaction on this thread's connection
+        Nested calls join the outer transaction; only the outermost commits
+        """
+        state = self._thread_connection()
+        conn = state.conn
+        if state.depth == 0:
+            # IMMEDIATE takes the write lock up front so we wait on busy_timeout
+            # instead of failing with "database is locked" on lock upgrade
+            conn.execute('BEGIN IMMEDIATE')
+        state.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            state.depth -= 1
+            if state.depth == 0:
+                conn.execute('ROLLBACK')
+            raise
+        state.depth -= 1
+        if state.depth == 0:
+            conn.execute('COMMIT')
+
+    def close_all(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = set()
+        self._local = threading.local()
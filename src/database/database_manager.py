@@ -1,120 +1,382 @@
-import sqlite3
+import os
+import time
 from datetime import datetime
+from itertools import islice
+from src.database.connection import ConnectionPool
+from src.database.identity import BIRTH_YEAR_TOLERANCE, birth_year, normalize_name
+from src.database.migrations import migrate
+from src.utils.metrics import instrument
+
+DIABETES_FIELDS = ['pregnancies', 'glucose', 'blood_pressure', 'skin_thickness',
+                   'insulin', 'bmi', 'diabetes_pedigree']
 
 class DatabaseManager:
     def __init__(self, db_path):
         self.db_path = db_path
-        self._create_tables()
-    
-    def _create_tables(self):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        # Create patients table
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS patients (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                age INTEGER,
-                gender TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create diabetes_records table
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS diabetes_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                patient_id INTEGER,
-                pregnancies INTEGER,
-                glucose REAL,
-                blood_pressure REAL,
-                skin_thickness REAL,
-                insulin REAL,
-                bmi REAL,
-                diabetes_pedigree REAL,
-                prediction INTEGER,
-                probability REAL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (patient_id) REFERENCES patients (id)
-            )
-        ''')
-        
-        # Create ulcer_records table
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS ulcer_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                patient_id INTEGER,
-                image_path TEXT,
-                prediction TEXT,
-                probability REAL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (patient_id) REFERENCES patients (id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        self.pool = ConnectionPool(db_path)
+        # Versioned schema; a current database does no DDL at startup
+        migrate(self.pool)
+        self.has_name_index = self.pool.connection().execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'patients_fts'"
+        ).fetchone() is not None
+    
+    def close(self):
+        self.pool.close_all()
     
+    @instrument('db.add_patient')
     def add_patient(self, name, age, gender):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
+        with self.pool.transaction() as conn:
+            c = conn.execute('''
+                INSERT INTO patients (name, age, gender, name_key, birth_year)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (name, age, gender, normalize_name(name), birth_year(age)))
+            
+            return c.lastrowid
+    
+    @instrument('db.find_patient')
+    def find_patient(self, name, age, gender):
+        """
+        Id of the existing patient with the same normalized name and gender and
+        a birth year within BIRTH_YEAR_TOLERANCE of the one implied by age,
+        closest first; None if there is none or the name is blank
+        """
+        name_key = normalize_name(name)
+        if name_key is None:
+            return None
+        year = birth_year(age)
+        conn = self.pool.connection()
+        if year is None:
+            row = conn.execute('''
+                SELECT id FROM patients
+                WHERE name_key = ? AND birth_year IS NULL AND gender IS ?
+                ORDER BY id LIMIT 1
+            ''', (name_key, gender)).fetchone()
+        else:
+            row = conn.execute('''
+                SELECT id FROM patients
+                WHERE name_key = ? AND birth_year BETWEEN ? AND ? AND gender IS ?
+                ORDER BY abs(birth_year - ?), id LIMIT 1
+            ''', (name_key, year - BIRTH_YEAR_TOLERANCE,
+                  year + BIRTH_YEAR_TOLERANCE, gender, year)).fetchone()
+        return row[0] if row else None
+    
+    @instrument('db.find_or_create_patient')
+    def find_or_create_patient(self, name, age, gender):
+        """
+        Reuse the patient a returning visitor already has (see find_patient),
+        updating their age, or register a new one
+        Returns the patient id
+        """
+        with self.pool.transaction() as conn:
+            patient_id = self.find_patient(name, age, gender)
+            if patient_id is None:
+                return self.add_patient(name, age, gender)
+            
+            conn.execute('UPDATE patients SET age = ? WHERE id = ? AND age IS NOT ?',
+                         (age, patient_id, age))
+            return patient_id
+    
+    @instrument('db.add_diabetes_record')
+    def add_diabetes_record(self, patient_id, data, prediction, probability):
+        with self.pool.transaction() as conn:
+            c = conn.execute('''
+                INSERT INTO diabetes_records 
+                (patient_id, pregnancies, glucose, blood_pressure, skin_thickness,
+                 insulin, bmi, diabetes_pedigree, prediction, probability)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (patient_id, data['pregnancies'], data['glucose'],
+                  data['blood_pressure'], data['skin_thickness'],
+                  data['insulin'], data['bmi'], data['diabetes_pedigree'],
+                  int(prediction), float(probability)))
+            
+            return c.lastrowid
+    
+    @instrument('db.add_ulcer_record')
+    def add_ulcer_record(self, patient_id, image_path, prediction, probability):
+        with self.pool.transaction() as conn:
+            c = conn.execute('''
+                INSERT INTO ulcer_records 
+                (patient_id, image_path, prediction, probability)
+                VALUES (?, ?, ?, ?)
+            ''', (patient_id, image_path, prediction, float(probability)))
+            
+            return c.lastrowid
+    
+    @instrument('db.add_diabetes_assessment')
+    def add_diabetes_assessment(self, name, age, gender, data, prediction, probability):
+        """
+        Find or register the patient and record their diabetes assessment in one transaction
+        Returns (patient_id, record_id)
+        """
+        with self.pool.transaction():
+            patient_id = self.find_or_create_patient(name, age, gender)
+            record_id = self.add_diabetes_record(patient_id, data, prediction, probability)
         
-        c.execute('''
-            INSERT INTO patients (name, age, gender)
-            VALUES (?, ?, ?)
-        ''', (name, age, gender))
+        return patient_id, record_id
+    
+    @instrument('db.add_ulcer_assessment')
+    def add_ulcer_assessment(self, name, age, gender, image_path, prediction, probability):
+        """
+        Find or register the patient and record their foot ulcer assessment in one transaction
+        Returns (patient_id, record_id)
+        """
+        with self.pool.transaction():
+            patient_id = self.find_or_create_patient(name, age, gender)
+            record_id = self.add_ulcer_record(patient_id, image_path, prediction, probability)
+        
+        return patient_id, record_id
+    
+    def set_diabetes_outcome(self, record_id, outcome):
+        """
+        Record the confirmed diagnosis (0/1, or None to clear it) for a diabetes
+        assessment. Returns False when there is no such record
+        """
+        with self.pool.transaction() as conn:
+            c = conn.execute('UPDATE diabetes_records SET outcome = ? WHERE id = ?',
+                             (None if outcome is None else int(outcome), record_id))
+            return c.rowcount > 0
+    
+    def get_labeled_diabetes_records(self, since_id=0):
+        """
+        Diabetes records with a confirmed outcome and id above since_id, with the
+        patient's age at the assessment, as a DataFrame in the data/diabetes.csv
+        layout plus the record id
+        """
+        import pandas as pd
         
-        patient_id = c.lastrowid
-        conn.commit()
-        conn.close()
+        return pd.read_sql_query('''
+            SELECT r.id, r.pregnancies AS Pregnancies, r.glucose AS Glucose,
+                   r.blood_pressure AS BloodPressure, r.skin_thickness AS SkinThickness,
+                   r.insulin AS Insulin, r.bmi AS BMI,
+                   r.diabetes_pedigree AS DiabetesPedigreeFunction,
+                   COALESCE(CAST(substr(r.created_at, 1, 4) AS INTEGER) - p.birth_year, p.age) AS Age,
+                   r.outcome AS Outcome
+            FROM diabetes_records r JOIN patients p ON p.id = r.patient_id
+            WHERE r.outcome IS NOT NULL AND r.id > ?
+            ORDER BY r.id
+        ''', self.pool.connection(), params=(since_id,))
+    
+    @instrument('db.add_ulcer_batch')
+    def add_ulcer_batch(self, name, age, gender, results):
+        """
+        Find or register the patient and record a batch of foot ulcer results
+        (dicts with image_path, prediction and probability) in one transaction
+        Returns (patient_id, record_ids)
+        """
+        with self.pool.transaction() as conn:
+            patient_id = self.find_or_create_patient(name, age, gender)
+            conn.executemany('''
+                INSERT INTO ulcer_records 
+                (patient_id, image_path, prediction, probability)
+                VALUES (?, ?, ?, ?)
+            ''', [(patient_id, r['image_path'], r['prediction'], float(r['probability']))
+                  for r in results])
+            
+            # Ids are consecutive while the transaction holds the write lock
+            last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
         
-        return patient_id
+        first_id = last_id - len(results) + 1
+        return patient_id, list(range(first_id, last_id + 1)) if results else []
     
-    def add_diabetes_record(self, patient_id, data, prediction, probability):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
+    @instrument('db.bulk_add_diabetes_assessments')
+    def bulk_add_diabetes_assessments(self, assessments, batch_size=5000):
+        """
+        Import historical diabetes assessments with executemany
+        assessments: iterable of dicts with name, age, gender, the DIABETES_FIELDS,
+        prediction and probability. Each batch is committed as one transaction
+        Returns {'rows', 'seconds', 'rows_per_sec'}
+        """
+        def record_row(patient_id, a):
+            return ((patient_id,) + tuple(a[field] for field in DIABETES_FIELDS)
+                    + (int(a['prediction']), float(a['probability'])))
         
-        c.execute('''
+        return self._bulk_add_assessments(assessments, batch_size, '''
             INSERT INTO diabetes_records 
             (patient_id, pregnancies, glucose, blood_pressure, skin_thickness,
              insulin, bmi, diabetes_pedigree, prediction, probability)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (patient_id, data['pregnancies'], data['glucose'],
-              data['blood_pressure'], data['skin_thickness'],
-              data['insulin'], data['bmi'], data['diabetes_pedigree'],
-              prediction, probability))
-        
-        record_id = c.lastrowid
-        conn.commit()
-        conn.close()
-        
-        return record_id
+        ''', record_row)
     
-    def add_ulcer_record(self, patient_id, image_path, prediction, probability):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
+    @instrument('db.bulk_add_ulcer_assessments')
+    def bulk_add_ulcer_assessments(self, assessments, batch_size=5000):
+        """
+        Import historical foot ulcer assessments with executemany
+        assessments: iterable of dicts with name, age, gender, image_path,
+        prediction and probability. Each batch is committed as one transaction
+        Returns {'rows', 'seconds', 'rows_per_sec'}
+        """
+        def record_row(patient_id, a):
+            return (patient_id, a['image_path'], a['prediction'], float(a['probability']))
         
-        c.execute('''
+        return self._bulk_add_assessments(assessments, batch_size, '''
             INSERT INTO ulcer_records 
             (patient_id, image_path, prediction, probability)
             VALUES (?, ?, ?, ?)
-        ''', (patient_id, image_path, prediction, probability))
+        ''', record_row)
+    
+    def _bulk_add_assessments(self, assessments, batch_size, record_sql, record_row):
+        start = time.perf_counter()
+        rows = 0
+        assessments = iter(assessments)
         
-        record_id = c.lastrowid
-        conn.commit()
-        conn.close()
+        while True:
+            batch = list(islice(assessments, batch_size))
+            if not batch:
+                break
+            
+            with self.pool.transaction() as conn:
+                # Historical imports always add patients; merge duplicates
+                # afterwards with python -m src.database.dedup
+                c = conn.executemany('''
+                    INSERT INTO patients (name, age, gender, name_key, birth_year)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [(a['name'], a['age'], a['gender'], normalize_name(a['name']),
+                       birth_year(a['age'])) for a in batch])
+                
+                # The write lock is held for the whole transaction, so the new
+                # AUTOINCREMENT ids are consecutive and end at last_insert_rowid()
+                last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+                first_id = last_id - len(batch) + 1
+                conn.executemany(record_sql, [record_row(first_id + i, a)
+                                              for i, a in enumerate(batch)])
+            rows += len(batch)
         
-        return record_id
+        seconds = time.perf_counter() - start
+        return {
+            'rows': rows,
+            'seconds': seconds,
+            'rows_per_sec': rows / seconds if seconds > 0 else 0.0
+        }
+    
+    def add_report_job(self, patient_id):
+        with self.pool.transaction() as conn:
+            c = conn.execute('INSERT INTO report_jobs (patient_id) VALUES (?)', (patient_id,))
+            return c.lastrowid
+    
+    def update_report_job(self, job_id, status, report_path=None, error=None):
+        finished = status in ('done', 'failed')
+        with self.pool.transaction() as conn:
+            conn.execute('''
+                UPDATE report_jobs
+                SET status = ?, report_path = ?, error = ?,
+                    finished_at = CASE WHEN ? THEN CURRENT_TIMESTAMP END
+                WHERE id = ?
+            ''', (status, report_path, error, finished, job_id))
+    
+    def get_report_job(self, job_id):
+        row = self.pool.connection().execute(
+            'SELECT * FROM report_jobs WHERE id = ?', (job_id,)
+        ).fetchone()
+        return dict(row) if row else None
     
+    @instrument('db.add_report')
+    def add_report(self, path, size_bytes, patient_id=None, assessment_type=None,
+                   assessment_id=None, created_at=None):
+        with self.pool.transaction() as conn:
+            c = conn.execute('''
+                INSERT OR IGNORE INTO reports
+                (patient_id, assessment_type, assessment_id, path, file_name, size_bytes, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            ''', (patient_id, assessment_type, assessment_id, path,
+                  os.path.basename(path), size_bytes, created_at))
+            
+            return c.lastrowid
+    
+    def index_report_files(self, directory):
+        """
+        Add PDFs in directory that are not in the reports table yet (files
+        generated before the index existed), dated by modification time
+        Returns the number of files added
+        """
+        if not os.path.isdir(directory):
+            return 0
+        
+        conn = self.pool.connection()
+        known = {row['path'] for row in conn.execute('SELECT path FROM reports')}
+        rows = []
+        for entry in os.scandir(directory):
+            path = os.path.join(directory, entry.name)
+            if entry.name.endswith('.pdf') and path not in known:
+                stat = entry.stat()
+                created_at = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(stat.st_mtime))
+                rows.append((path, entry.name, stat.st_size, created_at))
+        
+        with self.pool.transaction() as conn:
+            conn.executemany('''
+                INSERT OR IGNORE INTO reports (path, file_name, size_bytes, created_at)
+                VALUES (?, ?, ?, ?)
+            ''', rows)
+        return len(rows)
+    
+    def _report_filter(self, name=None, assessment_type=None):
+        # WHERE clause for the Report Manager filters; files indexed without a
+        # patient are matched on their file name, which embeds the patient name
+        clauses, params = [], []
+        if name:
+            clauses.append('(p.name LIKE ? OR r.file_name LIKE ?)')
+            params += [f"%{name}%", f"%{name.replace(' ', '_')}%"]
+        if assessment_type:
+            clauses.append('r.assessment_type = ?')
+            params.append(assessment_type)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', tuple(params)
+    
+    @instrument('db.search_reports')
+    def search_reports(self, name=None, assessment_type=None, limit=None, offset=0):
+        """
+        Report metadata, newest first, without touching the PDF files
+        Each row carries the patient's name when the report is linked to one
+        """
+        where, params = self._report_filter(name, assessment_type)
+        sql = f'''
+            SELECT r.*, p.name AS patient_name
+            FROM reports r LEFT JOIN patients p ON p.id = r.patient_id
+            {where}
+            ORDER BY r.created_at DESC, r.id DESC
+        '''
+        if limit is not None:
+            sql += ' LIMIT ? OFFSET ?'
+            params += (limit, offset)
+        
+        c = self.pool.connection().execute(sql, params)
+        return [dict(row) for row in c.fetchall()]
+    
+    @instrument('db.count_reports')
+    def count_reports(self, name=None, assessment_type=None):
+        where, params = self._report_filter(name, assessment_type)
+        return self.pool.connection().execute(f'''
+            SELECT COUNT(*) FROM reports r LEFT JOIN patients p ON p.id = r.patient_id
+            {where}
+        ''', params).fetchone()[0]
+    
+    def get_report(self, report_id):
+        row = self.pool.connection().execute(
+            'SELECT * FROM reports WHERE id = ?', (report_id,)
+        ).fetchone()
+        return dict(row) if row else None
+    
+    def get_ulcer_image_paths(self):
+        """Distinct image paths referenced by ulcer_records"""
+        c = self.pool.connection().execute(
+            'SELECT DISTINCT image_path FROM ulcer_records WHERE image_path IS NOT NULL'
+        )
+        return [row[0] for row in c]
+    
+    def replace_ulcer_image_paths(self, moves):
+        """Re-point ulcer_records from old to new image paths; moves: (old, new) pairs"""
+        with self.pool.transaction() as conn:
+            conn.executemany('UPDATE ulcer_records SET image_path = ? WHERE image_path = ?',
+                             [(new, old) for old, new in moves])
+    
+    @instrument('db.get_patient_records')
     def get_patient_records(self, patient_id):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
+        c = self.pool.connection().cursor()
         
         # Get patient info
         c.execute('SELECT * FROM patients WHERE id = ?', (patient_id,))
-        patient = dict(c.fetchone())
+        patient = c.fetchone()
+        if patient is None:
+            return None
+        patient = dict(patient)
         
         # Get diabetes records
         c.execute('SELECT * FROM diabetes_records WHERE patient_id = ?', (patient_id,))
@@ -124,10 +386,87 @@ class DatabaseManager:
         c.execute('SELECT * FROM ulcer_records WHERE patient_id = ?', (patient_id,))
         ulcer_records = [dict(row) for row in c.fetchall()]
         
-        conn.close()
-        
         return {
             'patient': patient,
             'diabetes_records': diabetes_records,
             'ulcer_records': ulcer_records
         }
+    
+    def _name_filter(self, name):
+        # FROM/WHERE clause for a case-insensitive substring match on names,
+        # through the trigram index for terms of three or more characters
+        if self.has_name_index and len(name) >= 3:
+            # Quote the term so it is matched as a literal substring
+            term = '"' + name.replace('"', '""') + '"'
+            return ('patients_fts JOIN patients p ON p.id = patients_fts.rowid '
+                    'WHERE patients_fts MATCH ?', (term,))
+        return 'patients p WHERE p.name LIKE ?', (f"%{name}%",)
+    
+    @instrument('db.search_patients')
+    def search_patients(self, name, limit=None, offset=0):
+        """
+        Case-insensitive substring search on patient names, ordered by id
+        limit/offset page through large result sets
+        """
+        clause, params = self._name_filter(name)
+        sql = f'SELECT p.* FROM {clause} ORDER BY p.id'
+        if limit is not None:
+            sql += ' LIMIT ? OFFSET ?'
+            params += (limit, offset)
+        
+        c = self.pool.connection().execute(sql, params)
+        return [dict(row) for row in c.fetchall()]
+    
+    @instrument('db.count_patients')
+    def count_patients(self, name):
+        clause, params = self._name_filter(name)
+        return self.pool.connection().execute(f'SELECT COUNT(*) FROM {clause}', params).fetchone()[0]
+    
+    @instrument('db.get_records_for_patients')
+    def get_records_for_patients(self, patient_ids):
+        """
+        Fetch diabetes and ulcer records for many patients with one query per table
+        Returns {patient_id: {'diabetes_records': [...], 'ulcer_records': [...]}}
+        """
+        patient_ids = list(dict.fromkeys(int(pid) for pid in patient_ids))
+        records = {pid: {'diabetes_records': [], 'ulcer_records': []} for pid in patient_ids}
+        conn = self.pool.connection()
+        
+        # Stay well under SQLite's bound-parameter limit
+        for i in range(0, len(patient_ids), 500):
+            chunk = patient_ids[i:i + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            for table in ('diabetes_records', 'ulcer_records'):
+                c = conn.execute(f'''
+                    SELECT * FROM {table}
+                    WHERE patient_id IN ({placeholders})
+                    ORDER BY patient_id, created_at
+                ''', chunk)
+                for row in c:
+                    records[row['patient_id']][table].append(dict(row))
+        
+        return records
+
+if __name__ == '__main__':
+    import argparse
+    import csv
+    
+    parser = argparse.ArgumentParser(description='Bulk-import historical assessments')
+    parser.add_argument('kind', choices=['diabetes', 'ulcer'])
+    parser.add_argument('csv_path', help='CSV with name, age, gender, the record columns, '
+                                         'prediction and probability')
+    parser.add_argument('--db', default='diacare_db.sqlite3')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+    
+    db = DatabaseManager(args.db)
+    with open(args.csv_path, newline='') as f:
+        rows = csv.DictReader(f)
+        if args.kind == 'diabetes':
+            stats = db.bulk_add_diabetes_assessments(rows, args.batch_size)
+        else:
+            stats = db.bulk_add_ulcer_assessments(rows, args.batch_size)
+    db.close()
+    
+    print(f"Imported {stats['rows']} assessments in {stats['seconds']:.2f}s "
+          f"({stats['rows_per_sec']:.0f} rows/sec)")
@@ -0,0 +1,117 @@
+import time
+
+from src.database.identity import BIRTH_YEAR_TOLERANCE
+
+# Tables whose patient_id is re-pointed when duplicates are merged
+PATIENT_TABLES = ['diabetes_records', 'ulcer_records', 'report_jobs', 'reports']
+
+def find_duplicates(conn, tolerance=BIRTH_YEAR_TOLERANCE):
+    """
+    Group patients sharing name_key and gender whose birth years lie within
+    tolerance of the group's earliest, in one ordered scan of the identity index
+    Patients with a blank name (NULL name_key) are never merged
+    Returns ({duplicate_id: canonical_id}, [(latest_age, canonical_id)]); the
+    canonical patient is the group's lowest id and takes its most recent age
+    """
+    rows = conn.execute('''
+        SELECT id, name_key, gender, birth_year, age FROM patients
+        WHERE name_key IS NOT NULL
+        ORDER BY name_key, gender, birth_year, id
+    ''')
+    merges, ages = {}, []
+    group, group_key, group_start = [], None, None
+
+    def close_group():
+        if len(group) > 1:
+            canonical = min(pid for pid, _ in group)
+            merges.update((pid, canonical) for pid, _ in group if pid != canonical)
+            ages.append((max(group)[1], canonical))
+
+    for pid, name_key, gender, year, age in rows:
+        key = (name_key, gender, year is None)
+        if key != group_key or (year is not None and year - group_start > tolerance):
+            close_group()
+            group, group_key, group_start = [], key, year
+        group.append((pid, age))
+    close_group()
+    return merges, ages
+
+def merge_duplicates(db, tolerance=BIRTH_YEAR_TOLERANCE, dry_run=False):
+    """
+    Merge duplicate patients (see find_duplicates): their records, report jobs
+    and reports are re-pointed to the canonical patient and the duplicate rows
+    deleted, in one transaction
+    Returns {'patients_before', 'patients_after', 'merged', 'repointed', 'seconds'}
+    """
+    start = time.perf_counter()
+    conn = db.pool.connection()
+    before = conn.execute('SELECT COUNT(*) FROM patients').fetchone()[0]
+
+    # Scanned outside the write transaction so the app keeps writing meanwhile;
+    # records added to a duplicate in between are still re-pointed below
+    merges, ages = find_duplicates(conn, tolerance)
+    repointed = {table: 0 for table in PATIENT_TABLES}
+
+    if merges and not dry_run:
+        with db.pool.transaction() as conn:
+            conn.execute('''
+                CREATE TEMP TABLE patient_merges (
+                    duplicate_id INTEGER PRIMARY KEY,
+                    canonical_id INTEGER NOT NULL
+                )
+            ''')
+            conn.executemany('INSERT INTO patient_merges VALUES (?, ?)', merges.items())
+            for table in PATIENT_TABLES:
+                c = conn.execute(f'''
+                    UPDATE {table}
+                    SET patient_id = (SELECT canonical_id FROM patient_merges
+                                      WHERE duplicate_id = {table}.patient_id)
+                    WHERE patient_id IN (SELECT duplicate_id FROM patient_merges)
+                ''')
+                repointed[table] = c.rowcount
+            conn.execute('DELETE FROM patients WHERE id IN (SELECT duplicate_id FROM patient_merges)')
+            conn.executemany('UPDATE patients SET age = ? WHERE id = ?', ages)
+            conn.execute('DROP TABLE patient_merges')
+
+    return {
+        'patients_before': before,
+        'patients_after': before if dry_run else before - len(merges),
+        'merged': len(merges),
+        'repointed': repointed,
+        'seconds': time.perf_counter() - start
+    }
+
+if __name__ == '__main__':
+    import argparse
+    import os
+    from src.database import analytics
+    from src.database.database_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description='Merge duplicate patient rows')
+    parser.add_argument('--db', default='diacare_db.sqlite3')
+    parser.add_argument('--tolerance', type=int, default=BIRTH_YEAR_TOLERANCE,
+                        help='Largest birth-year difference treated as the same patient')
+    parser.add_argument('--dry-run', action='store_true', help='Only count the duplicates')
+    parser.add_argument('--vacuum', action='store_true', help='Reclaim the freed space afterwards')
+    parser.add_argument('--export-dir', default=analytics.EXPORT_DIR,
+                        help='Parquet export to rebuild after merging, if it exists')
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.db)
+    stats = merge_duplicates(db, args.tolerance, args.dry_run)
+    if args.vacuum and not args.dry_run:
+        db.pool.connection().execute('VACUUM')
+    # The export still holds the merged-away patients and their old ids
+    rebuilt = None
+    if stats['merged'] and not args.dry_run and os.path.isdir(args.export_dir):
+        rebuilt = analytics.export_tables(db, args.export_dir, full=True)
+    db.close()
+
+    action = 'Would merge' if args.dry_run else 'Merged'
+    print(f"{action} {stats['merged']} duplicate patients: {stats['patients_before']} -> "
+          f"{stats['patients_after']} ({stats['seconds']:.2f}s)")
+    for table, rows in stats['repointed'].items():
+        if rows:
+            print(f"  {table}: {rows} rows re-pointed")
+    if rebuilt:
+        print(f"Rebuilt the analytics export in {args.export_dir} ({rebuilt['seconds']:.2f}s)")
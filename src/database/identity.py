@@ -0,0 +1,28 @@
+import re
+import unicodedata
+from datetime import datetime, timezone
+
+# Birth years within this many years of each other can be the same person:
+# an age recorded before and after a birthday differs by one
+BIRTH_YEAR_TOLERANCE = 1
+
+def normalize_name(name):
+    """
+    Matching key for a patient name: accents, case, punctuation and extra
+    whitespace removed, so 'José  Smith' and 'jose smith.' share a key
+    None for names with nothing left (blank or only punctuation): those are
+    unknown, not one shared identity, and never match each other
+    """
+    if name is None:
+        return None
+    decomposed = unicodedata.normalize('NFKD', str(name))
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(re.sub(r'[^\w\s]', ' ', stripped.casefold()).split()) or None
+
+def birth_year(age, year=None):
+    """Approximate birth year from an age given in year (default: this year)"""
+    if age is None or age == '':
+        return None
+    if year is None:
+        year = datetime.now(timezone.utc).year
+    return int(year) - int(age)
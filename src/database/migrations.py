@@ -0,0 +1,307 @@
+import sqlite3
+
+from src.database.identity import normalize_name
+
+# Legacy rows carry ISO timestamps ('2024-01-31T12:00:00.123456'); stored
+# as 'YYYY-MM-DD HH:MM:SS' like CURRENT_TIMESTAMP so they sort with new rows
+def _timestamp(column):
+    return f"COALESCE(substr(replace({column}, 'T', ' '), 1, 19), CURRENT_TIMESTAMP)"
+
+def _tables(c):
+    return {row[0] for row in c.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+def _columns(c, table):
+    return {row[1] for row in c.execute(f'PRAGMA table_info({table})')}
+
+def _base_schema(c):
+    # The old database_module created a denormalized diabetes_records on the
+    # same file; move it aside so the normalized table can take its name
+    if 'diabetes_records' in _tables(c) and 'patient_id' not in _columns(c, 'diabetes_records'):
+        c.execute('ALTER TABLE diabetes_records RENAME TO legacy_diabetes_records')
+
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS patients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            age INTEGER,
+            gender TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS diabetes_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id INTEGER,
+            pregnancies INTEGER,
+            glucose REAL,
+            blood_pressure REAL,
+            skin_thickness REAL,
+            insulin REAL,
+            bmi REAL,
+            diabetes_pedigree REAL,
+            prediction INTEGER,
+            probability REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (patient_id) REFERENCES patients (id)
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS ulcer_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id INTEGER,
+            image_path TEXT,
+            prediction TEXT,
+            probability REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (patient_id) REFERENCES patients (id)
+        )
+    ''')
+
+    # Indexes for per-patient record lookups and date ordering
+    c.execute('CREATE INDEX IF NOT EXISTS idx_patients_created_at ON patients (created_at)')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_diabetes_records_patient_id
+        ON diabetes_records (patient_id, created_at)
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_diabetes_records_created_at ON diabetes_records (created_at)')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_ulcer_records_patient_id
+        ON ulcer_records (patient_id, created_at)
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_ulcer_records_created_at ON ulcer_records (created_at)')
+
+def _report_jobs(c):
+    # Background PDF generation
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS report_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id INTEGER,
+            status TEXT NOT NULL DEFAULT 'queued',
+            report_path TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP,
+            FOREIGN KEY (patient_id) REFERENCES patients (id)
+        )
+    ''')
+
+def _reports(c):
+    # Generated PDFs, so the Report Manager pages through metadata instead
+    # of listing the folder
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id INTEGER,
+            assessment_type TEXT,
+            assessment_id INTEGER,
+            path TEXT NOT NULL UNIQUE,
+            file_name TEXT NOT NULL,
+            size_bytes INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (patient_id) REFERENCES patients (id)
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_reports_created_at ON reports (created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_reports_patient_id ON reports (patient_id)')
+
+def _diabetes_outcome(c):
+    # Confirmed diagnosis, recorded later, for retraining. Databases from
+    # before versioning may already have the column
+    if 'outcome' not in _columns(c, 'diabetes_records'):
+        c.execute('ALTER TABLE diabetes_records ADD COLUMN outcome INTEGER')
+
+def _name_index(c):
+    """
+    Trigram FTS5 index over patients.name, kept in sync by triggers
+    Skipped when this SQLite build lacks FTS5/trigram (before 3.34)
+    """
+    if 'patients_fts' in _tables(c):
+        return
+
+    try:
+        c.execute('''
+            CREATE VIRTUAL TABLE patients_fts USING fts5(
+                name, content='patients', content_rowid='id', tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        return
+
+    c.execute('''
+        CREATE TRIGGER patients_fts_insert AFTER INSERT ON patients BEGIN
+            INSERT INTO patients_fts (rowid, name) VALUES (new.id, new.name);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER patients_fts_delete AFTER DELETE ON patients BEGIN
+            INSERT INTO patients_fts (patients_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER patients_fts_update AFTER UPDATE OF name ON patients BEGIN
+            INSERT INTO patients_fts (patients_fts, rowid, name) VALUES ('delete', old.id, old.name);
+            INSERT INTO patients_fts (rowid, name) VALUES (new.id, new.name);
+        END
+    ''')
+
+    # Index the patients that existed before the migration
+    c.execute("INSERT INTO patients_fts (patients_fts) VALUES ('rebuild')")
+
+def _import_legacy_records(c):
+    """
+    Move rows from the old denormalized tables (legacy_diabetes_records,
+    foot_ulcer_records) into patients/diabetes_records/ulcer_records with
+    set-based INSERT ... SELECTs, then drop the old tables
+    One patient is created per distinct (name, age); legacy timestamps were
+    local time and are kept as they are
+    """
+    tables = _tables(c)
+    sources = []
+    if 'legacy_diabetes_records' in tables:
+        sources.append('SELECT name, age, timestamp FROM legacy_diabetes_records')
+    if 'foot_ulcer_records' in tables:
+        sources.append('SELECT name, age, timestamp FROM foot_ulcer_records')
+    if not sources:
+        return
+
+    c.execute(f'''
+        CREATE TEMP TABLE legacy_patients AS
+        SELECT COALESCE(name, 'Unknown') AS name, age, MIN({_timestamp('timestamp')}) AS created_at
+        FROM ({' UNION ALL '.join(sources)})
+        GROUP BY 1, 2
+        ORDER BY 3
+    ''')
+    count = c.execute('SELECT COUNT(*) FROM legacy_patients').fetchone()[0]
+    if count:
+        c.execute('''
+            INSERT INTO patients (name, age, created_at)
+            SELECT name, age, created_at FROM legacy_patients ORDER BY rowid
+        ''')
+        # The write lock is held for the whole transaction, so the new
+        # AUTOINCREMENT ids are consecutive and end at last_insert_rowid()
+        last_id = c.execute('SELECT last_insert_rowid()').fetchone()[0]
+        c.execute('ALTER TABLE legacy_patients ADD COLUMN patient_id INTEGER')
+        c.execute('UPDATE legacy_patients SET patient_id = rowid + ?', (last_id - count,))
+        c.execute('CREATE INDEX temp.idx_legacy_patients ON legacy_patients (name, age)')
+
+    join = "JOIN legacy_patients lp ON lp.name = COALESCE(l.name, 'Unknown') AND lp.age IS l.age"
+    if 'legacy_diabetes_records' in tables:
+        c.execute(f'''
+            INSERT INTO diabetes_records
+            (patient_id, glucose, blood_pressure, bmi, diabetes_pedigree, prediction, probability, created_at)
+            SELECT lp.patient_id, l.glucose, l.blood_pressure, l.bmi, l.diabetes_pedigree,
+                   l.prediction, l.confidence, {_timestamp('l.timestamp')}
+            FROM legacy_diabetes_records l {join}
+            ORDER BY l.id
+        ''')
+        c.execute('DROP TABLE legacy_diabetes_records')
+    if 'foot_ulcer_records' in tables:
+        c.execute(f'''
+            INSERT INTO ulcer_records (patient_id, image_path, prediction, probability, created_at)
+            SELECT lp.patient_id, l.image_path,
+                   CASE WHEN typeof(l.prediction) = 'text' THEN l.prediction
+                        WHEN l.prediction = 1 THEN 'Ulcer Detected' ELSE 'Normal' END,
+                   l.confidence, {_timestamp('l.timestamp')}
+            FROM foot_ulcer_records l {join}
+            ORDER BY l.id
+        ''')
+        c.execute('DROP TABLE foot_ulcer_records')
+    c.execute('DROP TABLE legacy_patients')
+
+def _decode_blob_predictions(c):
+    # Early versions stored numpy integers as raw 8-byte little-endian blobs
+    rows = c.execute(
+        "SELECT id, prediction FROM diabetes_records WHERE typeof(prediction) = 'blob'"
+    ).fetchall()
+    c.executemany('UPDATE diabetes_records SET prediction = ? WHERE id = ?',
+                  [(int.from_bytes(row[1], 'little', signed=True), row[0]) for row in rows])
+
+def _patient_identity(c):
+    """
+    Normalized identity columns on patients, so returning patients can be
+    found instead of re-created: name_key (see normalize_name) and the
+    birth year implied by the age at registration
+    """
+    columns = _columns(c, 'patients')
+    if 'name_key' not in columns:
+        c.execute('ALTER TABLE patients ADD COLUMN name_key TEXT')
+    if 'birth_year' not in columns:
+        c.execute('ALTER TABLE patients ADD COLUMN birth_year INTEGER')
+
+    c.connection.create_function('normalize_name', 1, normalize_name, deterministic=True)
+    c.execute('''
+        UPDATE patients
+        SET name_key = normalize_name(name),
+            birth_year = CAST(substr(created_at, 1, 4) AS INTEGER) - age
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_patients_identity ON patients (name_key, birth_year)')
+
+def _ulcer_image_path_index(c):
+    # Image store compaction re-points records by image path
+    c.execute('CREATE INDEX IF NOT EXISTS idx_ulcer_records_image_path ON ulcer_records (image_path)')
+
+def _blank_name_keys(c):
+    # Blank and punctuation-only names used to share the key '', so every
+    # nameless patient matched every other; they are now NULL and never match
+    c.execute("UPDATE patients SET name_key = NULL WHERE name_key = ''")
+
+# Applied in order; a database's PRAGMA user_version is the last one applied.
+# Append new steps, never edit or reorder released ones
+MIGRATIONS = [
+    (1, 'patients, diabetes_records and ulcer_records', _base_schema),
+    (2, 'report_jobs', _report_jobs),
+    (3, 'reports index', _reports),
+    (4, 'diabetes_records.outcome', _diabetes_outcome),
+    (5, 'patient name trigram index', _name_index),
+    (6, 'import legacy denormalized records', _import_legacy_records),
+    (7, 'decode blob diabetes predictions', _decode_blob_predictions),
+    (8, 'patient identity index', _patient_identity),
+    (9, 'ulcer image path index', _ulcer_image_path_index),
+    (10, 'blank patient name keys to NULL', _blank_name_keys),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(pool):
+    """
+    Bring the database behind pool up to LATEST_VERSION in one transaction
+    An up-to-date database costs a single PRAGMA read
+    Returns the (version, description) pairs applied
+    """
+    if schema_version(pool.connection()) >= LATEST_VERSION:
+        return []
+
+    applied = []
+    with pool.transaction() as conn:
+        # Re-read under the write lock: another process may have just migrated
+        current = schema_version(conn)
+        c = conn.cursor()
+        for version, description, step in MIGRATIONS:
+            if version > current:
+                step(c)
+                applied.append((version, description))
+        if applied:
+            c.execute(f'PRAGMA user_version = {LATEST_VERSION}')
+    return applied
+
+if __name__ == '__main__':
+    import argparse
+    from src.database.connection import ConnectionPool
+
+    parser = argparse.ArgumentParser(description='Apply pending schema migrations')
+    parser.add_argument('--db', default='diacare_db.sqlite3')
+    parser.add_argument('--status', action='store_true', help='Only print the schema version')
+    args = parser.parse_args()
+
+    pool = ConnectionPool(args.db)
+    before = schema_version(pool.connection())
+    if args.status:
+        print(f"Schema version {before} (latest {LATEST_VERSION})")
+    else:
+        for version, description in migrate(pool):
+            print(f"Applied {version}: {description}")
+        print(f"Schema version {before} -> {schema_version(pool.connection())}")
+    pool.close_all()
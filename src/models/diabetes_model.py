@@ -1,11 +1,21 @@
+import copy
+
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import accuracy_score, classification_report
-import joblib
+
+from src.utils.metrics import instrument
+
+# Feature columns in the order of data/diabetes.csv
+FEATURE_COLUMNS = [
+    'Pregnancies', 'Glucose', 'BloodPressure', 'SkinThickness',
+    'Insulin', 'BMI', 'DiabetesPedigreeFunction', 'Age'
+]
 
 def train_diabetes_model(data_path):
+    from sklearn.model_selection import train_test_split
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import accuracy_score, classification_report
+    
     # Load and prepare data
     df = pd.read_csv(data_path)
     X = df.drop('Outcome', axis=1)
@@ -25,16 +35,83 @@ def train_diabetes_model(data_path):
     
     return model, accuracy, report
 
+@instrument('diabetes.predict')
 def predict_diabetes(model, input_data):
     """
     Predict diabetes risk for a single patient
     input_data: dictionary containing patient features
     """
-    input_df = pd.DataFrame([input_data])
-    prediction = model.predict(input_df)
-    probability = model.predict_proba(input_df)
+    row = np.array([[input_data[column] for column in FEATURE_COLUMNS]], dtype=np.float64)
+    result = predict_diabetes_batch(model, row)
     
     return {
-        'prediction': prediction[0],
-        'probability': np.max(probability) * 100
+        'prediction': result['prediction'][0],
+        'probability': result['probability'][0]
     }
+
+@instrument('diabetes.predict_batch')
+def predict_diabetes_batch(model, input_data):
+    """
+    Predict diabetes risk for many patients with a single predict_proba pass
+    input_data: DataFrame with FEATURE_COLUMNS, or array with columns in that order
+    Returns arrays of labels and confidences (in percent)
+    """
+    if isinstance(input_data, pd.DataFrame):
+        model_input = input_data[FEATURE_COLUMNS]
+    else:
+        model_input = np.asarray(input_data).reshape(-1, len(FEATURE_COLUMNS))
+        # sklearn models fitted on a DataFrame expect named columns
+        if hasattr(model, 'feature_names_in_'):
+            model_input = pd.DataFrame(model_input, columns=FEATURE_COLUMNS)
+    
+    probability = model.predict_proba(model_input)
+    best = np.argmax(probability, axis=1)
+    
+    return {
+        'prediction': model.classes_[best],
+        'probability': probability[np.arange(len(best)), best] * 100
+    }
+
+def score_csv(model, csv_path, output_path, chunksize=10000, n_jobs=None, on_chunk=None):
+    """
+    Stream a CSV in the data/diabetes.csv layout through predict_diabetes_batch
+    csv_path/output_path: file paths or file-like objects
+    Writes the input rows plus Prediction/Probability columns to output_path,
+    calling on_chunk(rows_so_far) after each chunk. Returns the number of rows scored
+    """
+    if n_jobs is not None and hasattr(model, 'set_params'):
+        # Shallow copy: the fitted trees are shared, but the caller's model
+        # (often the app-wide cached one) keeps its own n_jobs
+        model = copy.copy(model)
+        model.set_params(n_jobs=n_jobs)
+    
+    rows = 0
+    for i, chunk in enumerate(pd.read_csv(csv_path, chunksize=chunksize)):
+        result = predict_diabetes_batch(model, chunk)
+        chunk['Prediction'] = result['prediction']
+        chunk['Probability'] = result['probability']
+        chunk.to_csv(output_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        rows += len(chunk)
+        if on_chunk:
+            on_chunk(rows)
+    
+    return rows
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    import joblib
+    
+    parser = argparse.ArgumentParser(description='Bulk-score a diabetes screening CSV')
+    parser.add_argument('input', help='CSV in the data/diabetes.csv column layout')
+    parser.add_argument('output', help='Where to write the scored CSV')
+    parser.add_argument('--model', default='model/diabetes_model.pkl')
+    parser.add_argument('--chunksize', type=int, default=10000)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    args = parser.parse_args()
+    
+    start = time.perf_counter()
+    rows = score_csv(joblib.load(args.model), args.input, args.output,
+                     chunksize=args.chunksize, n_jobs=args.n_jobs)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {rows} rows in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):.0f} rows/sec)")
@@ -0,0 +1,209 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.models.diabetes_model import FEATURE_COLUMNS, predict_diabetes, predict_diabetes_batch
+from src.models.ulcer_model import dataset_label, interpret_ulcer_prediction
+from src.utils.image_processing import IMAGE_SIZE, list_images, preprocess_images, read_file
+
+DIABETES_DATA = 'data/diabetes.csv'
+ULCER_DATA = ['data/foot_images/train', 'data/foot_images/vallidation']
+
+def classification_metrics(y_true, y_pred, scores):
+    """
+    Accuracy, precision, recall, ROC AUC and confusion matrix for a binary task
+    scores: probability of the positive class, used for the ROC curve
+    """
+    from sklearn.metrics import accuracy_score, confusion_matrix, precision_score, recall_score, roc_auc_score
+
+    y_true = np.asarray(y_true).astype(int)
+    y_pred = np.asarray(y_pred).astype(int)
+    return {
+        'samples': len(y_true),
+        'accuracy': float(accuracy_score(y_true, y_pred)),
+        'precision': float(precision_score(y_true, y_pred, zero_division=0)),
+        'recall': float(recall_score(y_true, y_pred, zero_division=0)),
+        # AUC is undefined when only one class is present
+        'roc_auc': float(roc_auc_score(y_true, scores)) if len(np.unique(y_true)) == 2 else None,
+        'confusion_matrix': confusion_matrix(y_true, y_pred, labels=[0, 1]).tolist(),
+    }
+
+def latency_stats(batch_seconds, batch_sizes, single_seconds=()):
+    """
+    Throughput and latency percentiles (milliseconds) from timed batches
+    Batched per-sample latency is each batch's time split over its samples;
+    single_seconds are timings of one-sample calls, the interactive path
+    """
+    batch_seconds = np.asarray(batch_seconds, dtype=np.float64)
+    batch_sizes = np.asarray(batch_sizes)
+    total = batch_seconds.sum()
+    per_sample = np.repeat(batch_seconds / np.maximum(batch_sizes, 1), batch_sizes) * 1000
+
+    stats = {
+        'batches': len(batch_seconds),
+        'seconds': float(total),
+        'samples_per_sec': float(batch_sizes.sum() / total) if total > 0 else 0.0,
+        'batched_per_sample_ms': _percentiles(per_sample),
+        'batch_ms': _percentiles(batch_seconds * 1000),
+    }
+    if len(single_seconds):
+        stats['single_sample_ms'] = _percentiles(np.asarray(single_seconds) * 1000)
+    return stats
+
+def _percentiles(values):
+    if not len(values):
+        return None
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99),
+            'mean': float(np.mean(values)), 'max': float(np.max(values))}
+
+def evaluate_diabetes(model, csv_path=DIABETES_DATA, batch_size=256, single_samples=200):
+    """
+    Stream csv_path through predict_diabetes_batch in chunks of batch_size,
+    then time predict_diabetes on the first single_samples rows
+    """
+    y_true, y_pred, scores = [], [], []
+    batch_seconds, batch_sizes = [], []
+    single_rows = []
+
+    for chunk in pd.read_csv(csv_path, chunksize=batch_size):
+        start = time.perf_counter()
+        result = predict_diabetes_batch(model, chunk[FEATURE_COLUMNS])
+        batch_seconds.append(time.perf_counter() - start)
+        batch_sizes.append(len(chunk))
+
+        prediction = np.asarray(result['prediction']).astype(int)
+        # Confidence is for the predicted class; ROC needs P(Outcome = 1)
+        confidence = np.asarray(result['probability'], dtype=np.float64) / 100
+        y_true.append(chunk['Outcome'].to_numpy())
+        y_pred.append(prediction)
+        scores.append(np.where(prediction == 1, confidence, 1 - confidence))
+
+        if len(single_rows) < single_samples:
+            single_rows.extend(chunk[FEATURE_COLUMNS].head(single_samples - len(single_rows))
+                               .to_dict('records'))
+
+    single_seconds = []
+    for row in single_rows:
+        start = time.perf_counter()
+        predict_diabetes(model, row)
+        single_seconds.append(time.perf_counter() - start)
+
+    if not batch_sizes:
+        return {'samples': 0}
+    report = classification_metrics(np.concatenate(y_true), np.concatenate(y_pred), np.concatenate(scores))
+    report['performance'] = latency_stats(batch_seconds, batch_sizes, single_seconds)
+    return report
+
+def evaluate_ulcer(model, image_dirs=ULCER_DATA, batch_size=32, image_size=IMAGE_SIZE,
+                   executor=None, single_samples=50):
+    """
+    Stream the images under image_dirs through the ulcer model in batches
+    Labels come from the folder names (dataset_label); each directory is
+    reported separately and combined
+    """
+    predict = model.predict_on_batch if hasattr(model, 'predict_on_batch') else model.predict
+    buffer = np.empty((batch_size, image_size[1], image_size[0], 3), dtype=np.float32)
+    report = {}
+    all_true, all_pred, all_scores = [], [], []
+    batch_seconds, batch_sizes = [], []
+
+    # The first call builds the inference graph; keep it out of the timings
+    buffer[:] = 0
+    predict(buffer)
+
+    for image_dir in image_dirs:
+        paths = list_images(image_dir)
+        y_true, y_pred, scores = [], [], []
+
+        for i in range(0, len(paths), batch_size):
+            chunk = paths[i:i + batch_size]
+            start = time.perf_counter()
+            batch = preprocess_images([read_file(path) for path in chunk], image_size,
+                                      out=buffer[:len(chunk)], executor=executor)
+            outputs = np.asarray(predict(batch))
+            batch_seconds.append(time.perf_counter() - start)
+            batch_sizes.append(len(chunk))
+
+            for path, row in zip(chunk, outputs):
+                result = interpret_ulcer_prediction(row)
+                positive = result['prediction'] == "Ulcer Detected"
+                y_true.append(dataset_label(path))
+                y_pred.append(int(positive))
+                scores.append(result['probability'] / 100 if positive else 1 - result['probability'] / 100)
+
+        if y_true:
+            report[image_dir] = classification_metrics(y_true, y_pred, scores)
+        all_true += y_true
+        all_pred += y_pred
+        all_scores += scores
+
+    if not all_true:
+        return {'samples': 0}
+
+    # Single-image latency, decode included, as on the detection page
+    single_seconds = []
+    for path in [p for d in image_dirs for p in list_images(d)][:single_samples]:
+        start = time.perf_counter()
+        predict(preprocess_images([read_file(path)], image_size))
+        single_seconds.append(time.perf_counter() - start)
+
+    report['overall'] = classification_metrics(all_true, all_pred, all_scores)
+    report['performance'] = latency_stats(batch_seconds, batch_sizes, single_seconds)
+    return report
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    from datetime import datetime
+    from src.models.loader import (COMPILED_DIABETES_MODEL_PATH, DIABETES_MODEL_PATH, ULCER_MODEL_PATH,
+                                   TFLITE_ULCER_MODEL_PATH, load_diabetes_model, load_ulcer_model)
+    from src.utils.image_processing import decoder_pool
+    from src.utils.prediction_cache import file_fingerprint
+
+    parser = argparse.ArgumentParser(description='Evaluate the shipped models on the bundled datasets')
+    parser.add_argument('--output', default='evaluation.json')
+    parser.add_argument('--models', nargs='+', choices=['diabetes', 'ulcer'], default=['diabetes', 'ulcer'])
+    parser.add_argument('--diabetes-engine', choices=['sklearn', 'compiled'], default='sklearn')
+    parser.add_argument('--diabetes-data', default=DIABETES_DATA)
+    parser.add_argument('--diabetes-batch-size', type=int, default=256)
+    parser.add_argument('--ulcer-backend', choices=['keras', 'tflite'], default='keras')
+    parser.add_argument('--tflite-model', help='Quantized model for --ulcer-backend tflite')
+    parser.add_argument('--ulcer-data', nargs='+', default=ULCER_DATA)
+    parser.add_argument('--ulcer-batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    results = {'created_at': datetime.now().isoformat(timespec='seconds')}
+
+    if 'diabetes' in args.models:
+        model_path = (COMPILED_DIABETES_MODEL_PATH if args.diabetes_engine == 'compiled'
+                      and os.path.exists(COMPILED_DIABETES_MODEL_PATH) else DIABETES_MODEL_PATH)
+        results['diabetes'] = evaluate_diabetes(load_diabetes_model(args.diabetes_engine),
+                                                args.diabetes_data, args.diabetes_batch_size)
+        results['diabetes'].update({'engine': args.diabetes_engine, 'model': model_path,
+                                    'model_version': file_fingerprint(model_path)})
+
+    if 'ulcer' in args.models:
+        ulcer_options = {'backend': args.ulcer_backend}
+        model_path = ULCER_MODEL_PATH
+        if args.ulcer_backend == 'tflite':
+            model_path = ulcer_options['tflite_path'] = args.tflite_model or TFLITE_ULCER_MODEL_PATH
+        model = load_ulcer_model(**ulcer_options)
+        with decoder_pool() as executor:
+            results['ulcer'] = evaluate_ulcer(model, args.ulcer_data, args.ulcer_batch_size,
+                                              executor=executor)
+        results['ulcer'].update({'backend': args.ulcer_backend, 'model': model_path,
+                                 'model_version': file_fingerprint(model_path)})
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    for name in args.models:
+        section = results[name]
+        quality = section.get('overall', section)
+        perf = section.get('performance', {})
+        print(f"{name}: accuracy {quality.get('accuracy', 0):.3f}, ROC AUC {quality.get('roc_auc')}, "
+              f"{perf.get('samples_per_sec', 0):.0f} samples/sec")
+    print(f"Wrote {args.output}")
@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+
+class CompiledForest:
+    """
+    Array-backed evaluator for a fitted scikit-learn RandomForestClassifier
+    All trees are flattened into contiguous node arrays and walked together,
+    one level per step, so scoring skips sklearn's validation and joblib
+    dispatch. predict_proba matches the source forest to float rounding.
+    Built for interactive single-row and small-batch scoring; sklearn's
+    compiled trees remain faster for very large batches
+    """
+    def __init__(self, feature, threshold, left, right, leaf_proba, roots,
+                 max_depth, classes, feature_names=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_proba = leaf_proba
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes_ = classes
+        self.feature_names = feature_names
+        # children[node, go_left] -> next node, one gather per level
+        self._children = np.stack([right, left], axis=1)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        features, thresholds, lefts, rights, probas, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            left = tree.children_left.astype(np.int64)
+            right = tree.children_right.astype(np.int64)
+            leaf = left == -1
+            node_ids = np.arange(n, dtype=np.int64)
+
+            # Leaves point at themselves, so walking max_depth steps from the
+            # root always ends on the right leaf without a per-step leaf check
+            left = np.where(leaf, node_ids, left) + offset
+            right = np.where(leaf, node_ids, right) + offset
+            feature = np.where(leaf, 0, tree.feature).astype(np.int64)
+
+            value = tree.value[:, 0, :]
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+
+            features.append(feature)
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(left)
+            rights.append(right)
+            probas.append(value / normalizer)
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n
+
+        feature_names = getattr(model, 'feature_names_in_', None)
+        return cls(
+            np.concatenate(features), np.concatenate(thresholds),
+            np.concatenate(lefts), np.concatenate(rights),
+            np.concatenate(probas), np.asarray(roots, dtype=np.int64),
+            max_depth, np.asarray(model.classes_),
+            None if feature_names is None else np.asarray(feature_names, dtype=object)
+        )
+
+    def save(self, path):
+        np.savez(
+            path, feature=self.feature, threshold=self.threshold,
+            left=self.left, right=self.right, leaf_proba=self.leaf_proba,
+            roots=self.roots, max_depth=self.max_depth, classes=self.classes_,
+            feature_names=(np.asarray([], dtype=str) if self.feature_names is None
+                           else self.feature_names.astype(str))
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            feature_names = data['feature_names']
+            return cls(
+                data['feature'], data['threshold'], data['left'], data['right'],
+                data['leaf_proba'], data['roots'], data['max_depth'], data['classes'],
+                feature_names.astype(object) if len(feature_names) else None
+            )
+
+    def _as_array(self, X):
+        if isinstance(X, pd.DataFrame):
+            # Reindexing costs more than scoring a row, so only do it when needed
+            if self.feature_names is not None and not np.array_equal(X.columns, self.feature_names):
+                X = X[list(self.feature_names)]
+            X = X.to_numpy(dtype=np.float32)
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN or infinity.")
+        return X
+
+    def predict_proba(self, X):
+        X = self._as_array(X)
+        n_rows, n_trees = len(X), len(self.roots)
+
+        # One cursor per (row, tree), all advanced one level per step
+        nodes = np.tile(self.roots, n_rows)
+        row_offsets = np.repeat(np.arange(n_rows) * X.shape[1], n_trees)
+        values = X.ravel()
+        for _ in range(self.max_depth):
+            go_left = values[row_offsets + self.feature[nodes]] <= self.threshold[nodes]
+            nodes = self._children[nodes, go_left.view(np.int8)]
+
+        proba = self.leaf_proba[nodes].reshape(n_rows, n_trees, -1)
+        return proba.sum(axis=1) / n_trees
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+def check_parity(model, compiled, X, atol=1e-9):
+    """
+    Compare compiled against the sklearn forest on X
+    Returns the max absolute probability difference; raises AssertionError on mismatch
+    """
+    expected = model.predict_proba(X)
+    actual = compiled.predict_proba(X)
+    max_diff = float(np.max(np.abs(expected - actual))) if len(expected) else 0.0
+
+    if max_diff > atol:
+        raise AssertionError(f"Compiled forest probabilities differ by up to {max_diff:g}")
+    if not np.array_equal(model.predict(X), compiled.predict(X)):
+        raise AssertionError("Compiled forest labels differ from sklearn")
+    return max_diff
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    import joblib
+
+    parser = argparse.ArgumentParser(description='Export the diabetes RandomForest to node arrays')
+    parser.add_argument('--model', default='model/diabetes_model.pkl')
+    parser.add_argument('--output', default='model/diabetes_model.npz')
+    parser.add_argument('--check-data', default='data/diabetes.csv',
+                        help='CSV used to verify parity with sklearn before saving')
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    compiled = CompiledForest.from_sklearn(model)
+
+    X = pd.read_csv(args.check_data)
+    X = X.drop(columns=['Outcome'], errors='ignore')
+    max_diff = check_parity(model, compiled, X)
+    compiled.save(args.output)
+
+    row = X.iloc[[0]]
+    timings = {}
+    for name, scorer in (('sklearn', model), ('compiled', compiled)):
+        start = time.perf_counter()
+        for _ in range(200):
+            scorer.predict_proba(row)
+        timings[name] = (time.perf_counter() - start) / 200 * 1e6
+
+    print(f"Saved {args.output}: {len(compiled.roots)} trees, {len(compiled.feature)} nodes, "
+          f"max parity diff {max_diff:g} over {len(X)} rows")
+    print(f"Single-row predict_proba: sklearn {timings['sklearn']:.0f}us, "
+          f"compiled {timings['compiled']:.0f}us")
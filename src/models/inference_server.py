@@ -0,0 +1,143 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+
+from src.utils import metrics
+
+class BatchingPredictor:
+    """
+    In-process micro-batching wrapper around a Keras-style model
+    Concurrent callers enqueue images; a worker thread groups them into batches
+    of up to max_batch_size samples, waiting at most max_wait_ms after the first
+    request, and runs one forward pass per batch
+    name labels the worker thread and the '<name>.batch_inference' metric
+    input_shape is the per-sample shape, by default the model's declared
+    input_shape; requests of another shape are rejected in submit()
+    """
+    def __init__(self, model, max_batch_size=32, max_wait_ms=10, name='ulcer', input_shape=None):
+        self.model = model
+        self.name = name
+        if input_shape is None:
+            declared = getattr(model, 'input_shape', None)
+            if declared is not None and None not in declared[1:]:
+                input_shape = declared[1:]
+        self.input_shape = None if input_shape is None else tuple(input_shape)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'batches': 0,
+            'samples': 0,
+            'max_batch_size': 0,
+            'inference_seconds': 0.0,
+        }
+        self._batch_sizes = Counter()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name=f'{name}-batcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, images):
+        """
+        Queue one image (H, W, C) or a batch (N, H, W, C) for prediction
+        Returns a Future resolving to the model output rows for these images
+        Raises ValueError if their shape doesn't match input_shape
+        """
+        if self._closed:
+            raise RuntimeError("BatchingPredictor is closed")
+        images = np.asarray(images, dtype=np.float32)
+        if images.ndim == 3:
+            images = images[np.newaxis]
+
+        if self.input_shape is not None and images.shape[1:] != self.input_shape:
+            raise ValueError(f"Expected inputs of shape (N, {', '.join(map(str, self.input_shape))}), "
+                             f"got {images.shape}")
+
+        future = Future()
+        self._queue.put((images, future))
+        return future
+
+    def predict(self, images, timeout=None):
+        return self.submit(images).result(timeout)
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['batch_size_histogram'] = dict(sorted(self._batch_sizes.items()))
+        stats['queue_depth'] = self._queue.qsize()
+        stats['mean_batch_size'] = stats['samples'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join()
+
+    def _collect(self, first):
+        # Gather requests until the batch is full or the deadline passes
+        pending = [first]
+        size = len(first[0])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending, size
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            pending, _ = self._collect(first)
+
+            # Without a declared input_shape requests may differ; each shape
+            # gets its own forward pass, so one odd request can't fail the rest
+            groups = {}
+            for item in pending:
+                groups.setdefault(item[0].shape[1:], []).append(item)
+            for group in groups.values():
+                self._predict(group)
+
+    def _predict(self, pending):
+        size = sum(len(images) for images, _ in pending)
+        start = time.perf_counter()
+        try:
+            batch = np.concatenate([images for images, _ in pending])
+            if hasattr(self.model, 'predict_on_batch'):
+                outputs = np.asarray(self.model.predict_on_batch(batch))
+            else:
+                outputs = np.asarray(self.model.predict(batch))
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        elapsed = time.perf_counter() - start
+        metrics.observe(f'{self.name}.batch_inference', elapsed)
+
+        offset = 0
+        for images, future in pending:
+            future.set_result(outputs[offset:offset + len(images)])
+            offset += len(images)
+
+        with self._lock:
+            self._stats['requests'] += len(pending)
+            self._stats['batches'] += 1
+            self._stats['samples'] += size
+            self._stats['max_batch_size'] = max(self._stats['max_batch_size'], size)
+            self._stats['inference_seconds'] += elapsed
+            self._batch_sizes[size] += 1
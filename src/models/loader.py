@@ -0,0 +1,78 @@
+import os
+import threading
+
+from src.utils.timing import timed
+
+DIABETES_MODEL_PATH = 'model/diabetes_model.pkl'
+COMPILED_DIABETES_MODEL_PATH = 'model/diabetes_model.npz'
+ULCER_MODEL_PATH = 'model/foot_ulcer_model.h5'
+TFLITE_ULCER_MODEL_PATH = 'model/foot_ulcer_model_int8.tflite'
+
+# Models are loaded once per process, on first use. Heavy libraries
+# (sklearn via joblib, tensorflow) are only imported here
+_models = {}
+_locks = {'diabetes': threading.Lock(), 'ulcer': threading.Lock()}
+
+def load_diabetes_model(engine='sklearn'):
+    """
+    Diabetes model for predict_diabetes
+    engine: 'sklearn' for the pickled RandomForest, 'compiled' for the
+    array-backed CompiledForest (exported .npz, or compiled from the pickle)
+    """
+    key = ('diabetes', engine)
+    with _locks['diabetes']:
+        if key not in _models:
+            with timed(f'load:diabetes_model:{engine}'):
+                if engine == 'compiled':
+                    from src.models.forest_engine import CompiledForest
+                    if os.path.exists(COMPILED_DIABETES_MODEL_PATH):
+                        model = CompiledForest.load(COMPILED_DIABETES_MODEL_PATH)
+                    else:
+                        model = CompiledForest.from_sklearn(_load_pickle(DIABETES_MODEL_PATH))
+                else:
+                    model = _load_pickle(DIABETES_MODEL_PATH)
+            _models[key] = model
+        return _models[key]
+
+def load_ulcer_model(backend='keras', tflite_path=TFLITE_ULCER_MODEL_PATH, num_threads=None):
+    """
+    Foot ulcer CNN
+    backend: 'keras' for the .h5 model, 'tflite' for the quantized model
+    written by src.models.tflite_backend, run with num_threads threads
+    """
+    key = ('ulcer', backend, tflite_path, num_threads)
+    with _locks['ulcer']:
+        if key not in _models:
+            if backend == 'tflite':
+                from src.models.tflite_backend import TFLiteUlcerModel
+                with timed('load:ulcer_model:tflite'):
+                    model = TFLiteUlcerModel(tflite_path, num_threads=num_threads)
+            else:
+                with timed('import:tensorflow'):
+                    import tensorflow as tf
+                with timed('load:ulcer_model:keras'):
+                    model = tf.keras.models.load_model(ULCER_MODEL_PATH)
+            _models[key] = model
+        return _models[key]
+
+def _load_pickle(path):
+    with timed('import:joblib'):
+        import joblib
+    return joblib.load(path)
+
+def warm_up(diabetes_engine='sklearn', **ulcer_options):
+    """
+    Load both models on a background thread, so the first inference page a
+    user opens doesn't pay for them. Failures are left for that page to report
+    """
+    def run():
+        for load in (lambda: load_diabetes_model(diabetes_engine),
+                     lambda: load_ulcer_model(**ulcer_options)):
+            try:
+                load()
+            except Exception:
+                pass
+
+    thread = threading.Thread(target=run, name='model-warm-up', daemon=True)
+    thread.start()
+    return thread
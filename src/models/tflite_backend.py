@@ -0,0 +1,177 @@
+import threading
+
+import numpy as np
+
+from src.models.ulcer_model import dataset_label, interpret_ulcer_prediction
+from src.utils.image_processing import IMAGE_SIZE, list_images, preprocess_images, read_file
+
+CALIBRATION_DIR = 'data/foot_images/vallidation'
+
+# Share of CALIBRATION_DIR used to calibrate int8 quantization; the rest is
+# held out for the drift report
+CALIBRATION_FRACTION = 0.5
+
+def calibration_split(image_dir=CALIBRATION_DIR, fraction=CALIBRATION_FRACTION, seed=0):
+    """
+    (calibration, held_out) image paths: a fixed shuffled split of image_dir,
+    so the drift report never scores images the quantizer was calibrated on
+    """
+    paths = list_images(image_dir)
+    order = np.random.default_rng(seed).permutation(len(paths))
+    n = int(round(len(paths) * fraction))
+    return [paths[i] for i in sorted(order[:n])], [paths[i] for i in sorted(order[n:])]
+
+def representative_dataset(calibration_dir=CALIBRATION_DIR, limit=200):
+    """Calibration batches for full-integer quantization, preprocessed like the app does"""
+    def generate():
+        for path in calibration_split(calibration_dir)[0][:limit]:
+            yield [preprocess_images([read_file(path)], IMAGE_SIZE)]
+    return generate
+
+def convert_to_tflite(h5_path, output_path, quantization='int8', calibration_dir=CALIBRATION_DIR):
+    """
+    Convert the Keras ulcer model to a quantized TFLite flatbuffer
+    quantization: 'int8' (weights and activations, calibrated on
+    calibration_dir; float input/output), 'float16' or 'dynamic' (int8 weights)
+    Returns the size of the written model in bytes
+    """
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(h5_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if quantization == 'int8':
+        converter.representative_dataset = representative_dataset(calibration_dir)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    elif quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization != 'dynamic':
+        raise ValueError(f"Unknown quantization: {quantization}")
+
+    flatbuffer = converter.convert()
+    with open(output_path, 'wb') as f:
+        f.write(flatbuffer)
+    return len(flatbuffer)
+
+def _interpreter_class():
+    # Prefer a standalone runtime on inference-only hosts, so tensorflow
+    # itself never has to be imported to serve
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        import tensorflow as tf
+        return tf.lite.Interpreter
+
+class TFLiteUlcerModel:
+    """
+    TFLite interpreter with the predict/predict_on_batch interface of the
+    Keras model, so it can stand in for it (e.g. behind BatchingPredictor)
+    """
+    def __init__(self, model_path, num_threads=None):
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self._interpreter = _interpreter_class()(model_path=model_path, num_threads=num_threads)
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = None
+        # The interpreter is not thread-safe
+        self._lock = threading.Lock()
+
+    def predict(self, images, **kwargs):
+        images = np.asarray(images, dtype=np.float32)
+        with self._lock:
+            if images.shape[0] != self._batch_size:
+                self._interpreter.resize_tensor_input(self._input['index'], images.shape)
+                self._interpreter.allocate_tensors()
+                self._batch_size = images.shape[0]
+            self._interpreter.set_tensor(self._input['index'], images)
+            self._interpreter.invoke()
+            return self._interpreter.get_tensor(self._output['index']).copy()
+
+    predict_on_batch = predict
+
+def drift_report(keras_model, tflite_model, paths=None, batch_size=32):
+    """
+    Compare the TFLite model against the Keras model on the image paths, by
+    default the held-out part of calibration_split()
+    Reports output drift, label agreement, and each model's accuracy against
+    the folder labels
+    """
+    if paths is None:
+        paths = calibration_split()[1]
+    labels = np.array([dataset_label(path) for path in paths])
+    keras_outputs, tflite_outputs = [], []
+
+    for i in range(0, len(paths), batch_size):
+        batch = preprocess_images([read_file(path) for path in paths[i:i + batch_size]], IMAGE_SIZE)
+        keras_outputs.append(np.asarray(keras_model.predict_on_batch(batch)))
+        tflite_outputs.append(tflite_model.predict(batch))
+
+    if not paths:
+        return {'images': 0}
+
+    keras_outputs = np.concatenate(keras_outputs)
+    tflite_outputs = np.concatenate(tflite_outputs)
+    keras_pred = np.array([interpret_ulcer_prediction(row)['prediction'] == "Ulcer Detected"
+                           for row in keras_outputs], dtype=int)
+    tflite_pred = np.array([interpret_ulcer_prediction(row)['prediction'] == "Ulcer Detected"
+                            for row in tflite_outputs], dtype=int)
+    diff = np.abs(keras_outputs - tflite_outputs)
+
+    return {
+        'images': len(paths),
+        'max_abs_diff': float(diff.max()),
+        'mean_abs_diff': float(diff.mean()),
+        'label_agreement': float(np.mean(keras_pred == tflite_pred)),
+        'keras_accuracy': float(np.mean(keras_pred == labels)),
+        'tflite_accuracy': float(np.mean(tflite_pred == labels)),
+    }
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import os
+    import time
+
+    parser = argparse.ArgumentParser(description='Convert the ulcer model to quantized TFLite')
+    parser.add_argument('--model', default='model/foot_ulcer_model.h5')
+    parser.add_argument('--quantization', choices=['int8', 'float16', 'dynamic'], default='int8')
+    parser.add_argument('--output', help='Defaults to model/foot_ulcer_model_<quantization>.tflite')
+    parser.add_argument('--calibration-dir', default=CALIBRATION_DIR,
+                        help='Half calibrates int8 quantization, the other half is scored by the drift report')
+    parser.add_argument('--num-threads', type=int, default=None)
+    parser.add_argument('--report', help='Write the drift report as JSON to this path')
+    args = parser.parse_args()
+
+    output = args.output or f"model/foot_ulcer_model_{args.quantization}.tflite"
+    size = convert_to_tflite(args.model, output, args.quantization, args.calibration_dir)
+    print(f"Wrote {output} ({size / 1e6:.1f} MB, Keras model {os.path.getsize(args.model) / 1e6:.1f} MB)")
+
+    import tensorflow as tf
+    keras_model = tf.keras.models.load_model(args.model)
+    tflite_model = TFLiteUlcerModel(output, num_threads=args.num_threads)
+
+    batch = preprocess_images([read_file(p) for p in list_images(args.calibration_dir)[:1]], IMAGE_SIZE)
+    if len(batch):
+        latency = {}
+        for name, model in (('keras', keras_model), ('tflite', tflite_model)):
+            model.predict_on_batch(batch)
+            start = time.perf_counter()
+            for _ in range(50):
+                model.predict_on_batch(batch)
+            latency[name] = (time.perf_counter() - start) / 50 * 1000
+        print(f"Single-image latency: keras {latency['keras']:.1f}ms, tflite {latency['tflite']:.1f}ms")
+
+    report = drift_report(keras_model, tflite_model, calibration_split(args.calibration_dir)[1])
+    report.update({'quantization': args.quantization, 'tflite_model': output})
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,216 @@
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.models.diabetes_model import FEATURE_COLUMNS
+
+VERSIONS_DIR = 'model/versions'
+
+PARAM_GRID = {
+    'n_estimators': [100, 200, 400],
+    'max_depth': [None, 8, 16],
+    'min_samples_leaf': [1, 2, 4],
+    'max_features': ['sqrt', 0.5],
+}
+
+def load_training_data(csv_path=None, db_path=None, since_id=0):
+    """
+    Labeled rows from the CSV and/or the confirmed diabetes_records in the
+    database (ids above since_id), in the data/diabetes.csv layout
+    Returns (data, max_record_id); max_record_id is the newest database row used
+    """
+    frames = []
+    max_record_id = since_id
+    if csv_path:
+        frames.append(pd.read_csv(csv_path)[FEATURE_COLUMNS + ['Outcome']])
+    if db_path:
+        from src.database.database_manager import DatabaseManager
+
+        db = DatabaseManager(db_path)
+        try:
+            records = db.get_labeled_diabetes_records(since_id)
+        finally:
+            db.close()
+        if len(records):
+            max_record_id = int(records['id'].max())
+        frames.append(records[FEATURE_COLUMNS + ['Outcome']])
+
+    if not frames:
+        raise ValueError("Give a CSV path, a database path or both")
+    data = pd.concat(frames, ignore_index=True)
+    data[FEATURE_COLUMNS] = data[FEATURE_COLUMNS].astype(np.float64)
+    data['Outcome'] = data['Outcome'].astype(int)
+    return data, max_record_id
+
+def search_hyperparameters(X, y, param_grid=PARAM_GRID, cv=5, n_jobs=-1, random_state=42):
+    """
+    Cross-validated grid search over RandomForest settings, scored by ROC AUC
+    Candidate fits run in parallel on joblib's process pool (n_jobs=-1: all cores)
+    Returns the fitted GridSearchCV; best_estimator_ is refit on all of X
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import GridSearchCV, StratifiedKFold
+
+    search = GridSearchCV(
+        RandomForestClassifier(random_state=random_state),
+        param_grid,
+        scoring='roc_auc',
+        cv=StratifiedKFold(n_splits=cv, shuffle=True, random_state=random_state),
+        n_jobs=n_jobs,
+        refit=True,
+    )
+    return search.fit(X, y)
+
+def grow_forest(model, X, y, n_new_trees=50, n_jobs=-1):
+    """
+    Add n_new_trees trees fitted on the new data X, y to a fitted forest,
+    keeping the existing trees (warm start), instead of refitting from scratch
+    """
+    if not np.array_equal(np.unique(y), model.classes_):
+        raise ValueError("New data must contain every class the model was trained on")
+
+    serving_n_jobs = model.n_jobs
+    model.set_params(warm_start=True, n_estimators=model.n_estimators + n_new_trees, n_jobs=n_jobs)
+    model.fit(X, y)
+    model.set_params(warm_start=False, n_jobs=serving_n_jobs)
+    return model
+
+def holdout_metrics(model, X, y):
+    from src.models.evaluation import classification_metrics
+
+    proba = model.predict_proba(X)
+    positive = list(model.classes_).index(1)
+    return classification_metrics(y, model.predict(X), proba[:, positive])
+
+def save_artifact(model, metrics, output_dir=VERSIONS_DIR):
+    """
+    Write model/versions/diabetes_model_<version>.pkl and its metrics JSON
+    Returns (model_path, metrics_path)
+    """
+    import joblib
+    from src.utils.prediction_cache import file_fingerprint
+
+    os.makedirs(output_dir, exist_ok=True)
+    version = datetime.now().strftime('%Y%m%d_%H%M%S')
+    model_path = os.path.join(output_dir, f"diabetes_model_{version}.pkl")
+    joblib.dump(model, model_path)
+
+    metrics = dict(metrics, version=version, model_path=model_path,
+                   model_fingerprint=file_fingerprint(model_path))
+    metrics_path = os.path.join(output_dir, f"diabetes_model_{version}.json")
+    with open(metrics_path, 'w') as f:
+        json.dump(metrics, f, indent=2, default=str)
+    return model_path, metrics_path
+
+def promote(model_path, target='model/diabetes_model.pkl'):
+    """
+    Make a versioned artifact the served model, atomically
+    Its metrics JSON is copied alongside, so a later grow knows which records
+    it has seen; a stale compiled export (model/diabetes_model.npz) is regenerated
+    """
+    from src.models.loader import COMPILED_DIABETES_MODEL_PATH
+
+    for source, destination in ((model_path, target),
+                                (os.path.splitext(model_path)[0] + '.json',
+                                 os.path.splitext(target)[0] + '.json')):
+        if os.path.exists(source):
+            tmp_path = f"{destination}.{os.getpid()}.tmp"
+            shutil.copyfile(source, tmp_path)
+            os.replace(tmp_path, destination)
+
+    if os.path.exists(COMPILED_DIABETES_MODEL_PATH):
+        import joblib
+        from src.models.forest_engine import CompiledForest
+        CompiledForest.from_sklearn(joblib.load(target)).save(COMPILED_DIABETES_MODEL_PATH)
+
+def _previous_metrics(model_path):
+    metrics_path = os.path.splitext(model_path)[0] + '.json'
+    if os.path.exists(metrics_path):
+        with open(metrics_path) as f:
+            return json.load(f)
+    return {}
+
+if __name__ == '__main__':
+    import argparse
+    import joblib
+    import sklearn
+    from sklearn.model_selection import train_test_split
+
+    parser = argparse.ArgumentParser(description='Train or grow the diabetes RandomForest')
+    parser.add_argument('mode', choices=['search', 'grow'],
+                        help='search: CV grid search and full fit; grow: add trees for new records')
+    parser.add_argument('--csv', default='data/diabetes.csv', help="Use '' to skip the CSV")
+    parser.add_argument('--db', default='diacare_db.sqlite3',
+                        help="Also train on assessments with a confirmed diagnosis, set on the Patient "
+                             "Records page or via PUT /v1/diabetes/records/<id>/outcome. Use '' to skip")
+    parser.add_argument('--cv', type=int, default=5)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--base', default='model/diabetes_model.pkl', help='Model to grow')
+    parser.add_argument('--new-trees', type=int, default=50)
+    parser.add_argument('--output-dir', default=VERSIONS_DIR)
+    parser.add_argument('--promote', action='store_true',
+                        help='Also install the new model as model/diabetes_model.pkl')
+    args = parser.parse_args()
+
+    metrics = {
+        'mode': args.mode,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'sklearn_version': sklearn.__version__,
+        'cpu_count': os.cpu_count(),
+        'n_jobs': args.n_jobs,
+    }
+
+    if args.mode == 'search':
+        data, max_record_id = load_training_data(args.csv or None, args.db or None)
+        X_train, X_test, y_train, y_test = train_test_split(
+            data[FEATURE_COLUMNS], data['Outcome'], test_size=0.2,
+            stratify=data['Outcome'], random_state=42)
+
+        start = time.perf_counter()
+        search = search_hyperparameters(X_train, y_train, cv=args.cv, n_jobs=args.n_jobs)
+        model = search.best_estimator_
+        metrics.update({
+            'search_seconds': time.perf_counter() - start,
+            'candidates': len(search.cv_results_['params']),
+            'best_params': search.best_params_,
+            'cv_roc_auc': float(search.best_score_),
+            'refit_seconds': float(search.refit_time_),
+        })
+    else:
+        model = joblib.load(args.base)
+        # Only records confirmed since the base model was trained
+        since_id = _previous_metrics(args.base).get('db_max_record_id', 0)
+        data, max_record_id = load_training_data(None, args.db, since_id)
+        if len(data) < 10:
+            parser.exit(message=f"Only {len(data)} new labeled records since record {since_id}; "
+                                "nothing to grow\n")
+        X_train, X_test, y_train, y_test = train_test_split(
+            data[FEATURE_COLUMNS], data['Outcome'], test_size=0.2, random_state=42)
+
+        start = time.perf_counter()
+        grow_forest(model, X_train, y_train, args.new_trees, args.n_jobs)
+        metrics.update({
+            'base_model': args.base,
+            'since_record_id': since_id,
+            'grow_seconds': time.perf_counter() - start,
+            'n_estimators': model.n_estimators,
+        })
+
+    metrics.update({
+        'training_rows': len(X_train),
+        'test_rows': len(X_test),
+        'db_max_record_id': max_record_id,
+        'test': holdout_metrics(model, X_test, y_test),
+    })
+    model_path, metrics_path = save_artifact(model, metrics, args.output_dir)
+    print(f"Saved {model_path} (test accuracy {metrics['test']['accuracy']:.3f}, "
+          f"ROC AUC {metrics['test']['roc_auc']}) and {metrics_path}")
+
+    if args.promote:
+        promote(model_path)
+        print("Promoted to model/diabetes_model.pkl")
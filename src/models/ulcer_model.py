@@ -1,11 +1,18 @@
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Conv2D, MaxPooling2D, Dense, Flatten, Dropout
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
-import tensorflow as tf
+import os
 
-def create_ulcer_model():
+import numpy as np
+
+from src.utils.image_processing import IMAGE_SIZE
+
+# TensorFlow is imported inside the functions that need it, so importing
+# this module (e.g. for interpret_ulcer_prediction) stays cheap
+
+def create_ulcer_model(input_shape=(224, 224, 3)):
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Conv2D, MaxPooling2D, Dense, Flatten, Dropout
+    
     model = Sequential([
-        Conv2D(32, (3, 3), activation='relu', input_shape=(224, 224, 3)),
+        Conv2D(32, (3, 3), activation='relu', input_shape=input_shape),
         MaxPooling2D(2, 2),
         Conv2D(64, (3, 3), activation='relu'),
         MaxPooling2D(2, 2),
@@ -23,8 +30,72 @@ def create_ulcer_model():
     
     return model
 
-def train_model(train_dir, validation_dir, epochs=20):
-    model = create_ulcer_model()
+def make_dataset(directory, image_size, batch_size=32, training=False, cache=True, seed=42):
+    """
+    tf.data input pipeline over a class-per-folder image directory
+    Images are decoded and resized in parallel and cached as uint8 after the
+    first epoch (in memory, or in the file named by cache); training batches
+    are then shuffled and augmented with vectorized Keras layers, and
+    everything is prefetched so the model never waits on input
+    """
+    import tensorflow as tf
+    
+    # Nearest-neighbour resize, as at inference (keras load_img / decode_image).
+    # Loaded in batches and split back into images, since batch_size=None
+    # needs a newer TensorFlow than requirements.txt pins
+    dataset = tf.keras.utils.image_dataset_from_directory(
+        directory,
+        label_mode='categorical',
+        image_size=image_size,
+        interpolation='nearest',
+        batch_size=batch_size,
+        shuffle=training,
+        seed=seed
+    ).unbatch()
+    dataset = dataset.map(lambda x, y: (tf.cast(x, tf.uint8), y),
+                          num_parallel_calls=tf.data.AUTOTUNE)
+    if cache:
+        dataset = dataset.cache('' if cache is True else cache)
+    if training:
+        dataset = dataset.shuffle(1000, seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    
+    rescale = tf.keras.layers.Rescaling(1./255)
+    if training:
+        augment = tf.keras.Sequential([
+            tf.keras.layers.RandomRotation(40 / 360, fill_mode='nearest', seed=seed),
+            tf.keras.layers.RandomTranslation(0.2, 0.2, fill_mode='nearest', seed=seed),
+            tf.keras.layers.RandomZoom(0.2, fill_mode='nearest', seed=seed),
+            tf.keras.layers.RandomFlip('horizontal', seed=seed),
+        ])
+        dataset = dataset.map(lambda x, y: (augment(rescale(x), training=True), y),
+                              num_parallel_calls=tf.data.AUTOTUNE)
+    else:
+        dataset = dataset.map(lambda x, y: (rescale(x), y),
+                              num_parallel_calls=tf.data.AUTOTUNE)
+    
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+def train_model(train_dir, validation_dir, epochs=20, pipeline='tf.data', batch_size=32, cache=True,
+                image_size=IMAGE_SIZE):
+    """
+    Train the ulcer CNN on class-per-folder image directories
+    pipeline: 'tf.data' (parallel decode, cached, vectorized augmentation) or
+    'generator' (the legacy single-threaded ImageDataGenerator)
+    image_size defaults to the size the app feeds the model, so the result
+    can replace model/foot_ulcer_model.h5 as is
+    """
+    model = create_ulcer_model(input_shape=(*image_size, 3))
+    
+    if pipeline == 'tf.data':
+        history = model.fit(
+            make_dataset(train_dir, image_size, batch_size, training=True, cache=cache),
+            epochs=epochs,
+            validation_data=make_dataset(validation_dir, image_size, batch_size, cache=cache)
+        )
+        return model, history
+    
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
     
     train_datagen = ImageDataGenerator(
         rescale=1./255,
@@ -41,24 +112,73 @@ def train_model(train_dir, validation_dir, epochs=20):
 
     train_generator = train_datagen.flow_from_directory(
         train_dir,
-        target_size=(224, 224),
-        batch_size=32,
+        target_size=image_size,
+        batch_size=batch_size,
         class_mode='categorical'
     )
 
     validation_generator = validation_datagen.flow_from_directory(
         validation_dir,
-        target_size=(224, 224),
-        batch_size=32,
+        target_size=image_size,
+        batch_size=batch_size,
         class_mode='categorical'
     )
 
     history = model.fit(
         train_generator,
-        steps_per_epoch=train_generator.samples // 32,
+        steps_per_epoch=train_generator.samples // batch_size,
         epochs=epochs,
         validation_data=validation_generator,
-        validation_steps=validation_generator.samples // 32
+        validation_steps=validation_generator.samples // batch_size
     )
 
     return model, history
+
+def interpret_ulcer_prediction(prediction):
+    """
+    Turn one row of model output into a label and confidence (in percent)
+    Handles both two-class softmax and single sigmoid outputs
+    """
+    if len(prediction) > 1:
+        score = float(prediction[1])  # Probability of ulcer class
+    else:
+        score = float(prediction[0])  # Single output
+    
+    return {
+        'prediction': "Ulcer Detected" if score > 0.5 else "Normal",
+        'probability': score * 100 if score > 0.5 else (1 - score) * 100
+    }
+
+def score_images(model, images, image_size, batch_size=32, executor=None, on_batch=None):
+    """
+    Predict many encoded images in batched forward passes
+    Each batch is decoded (in parallel with executor) into one reused
+    preallocated buffer. on_batch(done) is called after every batch
+    Returns one interpret_ulcer_prediction dict per image, in order
+    """
+    from src.utils.image_processing import preprocess_images
+    
+    images = list(images)
+    buffer = np.empty((min(batch_size, len(images)), image_size[1], image_size[0], 3), dtype=np.float32)
+    results = []
+    
+    for start in range(0, len(images), batch_size):
+        chunk = images[start:start + batch_size]
+        batch = preprocess_images(chunk, image_size, out=buffer[:len(chunk)], executor=executor)
+        if hasattr(model, 'predict_on_batch'):
+            outputs = np.asarray(model.predict_on_batch(batch))
+        else:
+            outputs = np.asarray(model.predict(batch))
+        results.extend(interpret_ulcer_prediction(row) for row in outputs)
+        if on_batch is not None:
+            on_batch(len(results))
+    
+    return results
+
+def dataset_label(image_path):
+    """
+    Ground-truth class of an image in data/foot_images, from its folder name
+    1 for ulcer_foot, 0 for Normal_foot/normal_foot
+    """
+    folder = os.path.basename(os.path.dirname(image_path)).lower()
+    return 1 if 'ulcer' in folder else 0
@@ -0,0 +1,90 @@
+import hashlib
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+# Input size expected by model/foot_ulcer_model.h5
+IMAGE_SIZE = (128, 128)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+def decode_image(data, target_size=IMAGE_SIZE):
+    """
+    Decode uploaded image bytes to an RGB PIL image of target_size (width, height)
+    Mirrors keras load_img: RGB conversion, then nearest-neighbour resize
+    """
+    img = Image.open(io.BytesIO(data))
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    if img.size != tuple(target_size):
+        img = img.resize(tuple(target_size), Image.NEAREST)
+    return img
+
+def preprocess_images(images, target_size=IMAGE_SIZE, out=None, executor=None):
+    """
+    Decode, resize and normalize many images straight into a float32 batch
+    images: iterable of encoded image bytes
+    out: optional preallocated (N, height, width, 3) float32 buffer to fill
+    executor: optional thread pool to decode on; PIL releases the GIL while
+    decoding and resizing, so images are processed in parallel
+    Returns the (N, height, width, 3) batch with pixel values in [0, 1]
+    """
+    images = list(images)
+    if out is None:
+        out = np.empty((len(images), target_size[1], target_size[0], 3), dtype=np.float32)
+
+    if executor is None:
+        for i, data in enumerate(images):
+            preprocess_into(data, out[i], target_size)
+    else:
+        # Consume the iterator so decode errors are raised here
+        list(executor.map(lambda i: preprocess_into(images[i], out[i], target_size),
+                          range(len(images))))
+
+    return out
+
+def preprocess_into(data, out, target_size=IMAGE_SIZE):
+    """Decode one image into out, a (height, width, 3) float32 view"""
+    pixels = np.asarray(decode_image(data, target_size))
+    np.divide(pixels, 255.0, out=out, dtype=np.float32)
+    return out
+
+def preprocess_image(data, target_size=IMAGE_SIZE):
+    """Single image as a (1, height, width, 3) model input batch"""
+    return preprocess_images([data], target_size)
+
+def list_images(directory):
+    """Sorted paths of all images under directory, recursively"""
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+def read_zip_images(data):
+    """(name, bytes) for every image in a ZIP archive, in archive order"""
+    images = []
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            # Skip folders and the resource forks macOS adds to archives
+            if info.is_dir() or name.startswith('__MACOSX/') or os.path.basename(name).startswith('._'):
+                continue
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                images.append((name, archive.read(info)))
+    return images
+
+def decoder_pool(max_workers=None):
+    """Thread pool for preprocess_images(executor=...)"""
+    return ThreadPoolExecutor(max_workers=max_workers or min(8, os.cpu_count() or 1),
+                              thread_name_prefix='image-decoder')
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
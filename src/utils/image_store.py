@@ -0,0 +1,273 @@
+import io
+import os
+import tempfile
+import time
+
+from PIL import Image
+
+from src.utils.image_processing import content_hash
+
+IMAGE_STORE_DIR = 'images'
+
+# Originals are capped at this edge and kept as JPEG
+MAX_EDGE = 2048
+ORIGINAL_QUALITY = 90
+
+# Pre-generated at save time: 'thumb' fits the Patient Records preview
+# (200px shown, 400px for high-DPI screens); 'print' is the report's 4x3 inch
+# image box at 150 DPI, the size report_generator.shrink_image produces
+VARIANTS = {
+    'thumb': {'size': (400, 400), 'fit': True, 'quality': 80},
+    'print': {'size': (600, 450), 'fit': False, 'quality': 85},
+}
+
+# Retention tiers for compact(): originals older than ARCHIVE_AFTER_DAYS are
+# re-encoded smaller; thumbnails and print copies are kept as they are
+ARCHIVE_AFTER_DAYS = 180
+ARCHIVE_EDGE = 1024
+ARCHIVE_QUALITY = 75
+
+# Files younger than this are never deleted, so in-flight uploads survive
+GRACE_HOURS = 24
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a unique temporary name first so readers never see a partial
+    # file, and threads storing the same image don't share one
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.',
+                                    suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _encode(img, quality):
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
+
+def _open_rgb(source, size=None):
+    img = Image.open(source)
+    if size is not None and img.format == 'JPEG':
+        # Let the JPEG decoder downscale while decoding (DCT scaling)
+        img.draft('RGB', size)
+    return img.convert('RGB') if img.mode != 'RGB' else img
+
+def _render_variant(img, variant):
+    spec = VARIANTS[variant]
+    if spec['fit']:
+        img = img.copy()
+        img.thumbnail(spec['size'], Image.LANCZOS)
+    else:
+        img = img.resize(spec['size'], Image.BILINEAR)
+    return _encode(img, spec['quality'])
+
+def _compress_original(data, max_edge=MAX_EDGE, quality=ORIGINAL_QUALITY):
+    # A JPEG that already fits is kept byte for byte
+    img = Image.open(io.BytesIO(data))
+    if img.format == 'JPEG' and max(img.size) <= max_edge:
+        return data
+    img = img.convert('RGB') if img.mode != 'RGB' else img
+    if max(img.size) > max_edge:
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    return _encode(img, quality)
+
+def stored_variant(image_path, variant):
+    """Path of the pre-generated variant of a store original, or None"""
+    originals_dir, shard = os.path.split(os.path.dirname(image_path))
+    if os.path.basename(originals_dir) != 'originals':
+        return None
+    path = os.path.join(os.path.dirname(originals_dir), variant, shard, os.path.basename(image_path))
+    return path if os.path.exists(path) else None
+
+class ImageStore:
+    """
+    Content-addressed store for ulcer photos under root:
+    originals/ab/<sha256>.jpg plus one pre-generated copy per VARIANTS entry
+    at <variant>/ab/<sha256>.jpg, keyed by the sha256 of the uploaded bytes
+    """
+    def __init__(self, root=IMAGE_STORE_DIR):
+        self.root = root
+
+    def _path(self, kind, key):
+        return os.path.join(self.root, kind, key[:2], key + '.jpg')
+
+    def _key(self, image_path):
+        # Store paths and content-addressed temp/ uploads are named by their
+        # hash; anything else is hashed from its bytes
+        key = os.path.splitext(os.path.basename(image_path))[0]
+        if len(key) == 64 and all(ch in '0123456789abcdef' for ch in key):
+            return key
+        with open(image_path, 'rb') as f:
+            return content_hash(f.read())
+
+    def contains(self, image_path):
+        originals = os.path.join(os.path.abspath(self.root), 'originals') + os.sep
+        return os.path.abspath(image_path).startswith(originals)
+
+    def put(self, data, key=None):
+        """
+        Save uploaded image bytes: a compressed original and every variant
+        Identical uploads map to the same files and are only written once
+        Returns the original's path, to be stored in ulcer_records.image_path
+        """
+        key = key or content_hash(data)
+        path = self._path('originals', key)
+        if os.path.exists(path):
+            # Reused by a new record: make the files young again, so compact()
+            # doesn't remove them as old orphans within the grace period
+            for kind in ['originals'] + list(VARIANTS):
+                if os.path.exists(self._path(kind, key)):
+                    os.utime(self._path(kind, key))
+            return path
+
+        # Decoded once, at no more than the largest variant needs
+        largest = max((spec['size'] for spec in VARIANTS.values()), key=lambda size: size[0] * size[1])
+        img = _open_rgb(io.BytesIO(data), largest)
+        for variant in VARIANTS:
+            _write(self._path(variant, key), _render_variant(img, variant))
+        # The original is written last: once it exists, so do the variants
+        _write(path, _compress_original(data))
+        return path
+
+    def variant(self, image_path, variant='thumb'):
+        """
+        Path of the pre-generated variant for a stored image. Images saved
+        before the store existed get theirs generated on first request
+        Returns None when the source image is gone or can't be decoded
+        """
+        if not image_path or not os.path.exists(image_path):
+            return None
+
+        try:
+            path = self._path(variant, self._key(image_path))
+            if not os.path.exists(path):
+                img = _open_rgb(image_path, VARIANTS[variant]['size'])
+                _write(path, _render_variant(img, variant))
+        except OSError:
+            # Also PIL.UnidentifiedImageError, for corrupt legacy uploads
+            return None
+        return path
+
+    def read_variant(self, image_path, variant='print'):
+        """Bytes of a variant, or None (see variant)"""
+        path = self.variant(image_path, variant)
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def usage(self):
+        """{'files', 'bytes'} per top-level store folder"""
+        usage = {}
+        for kind in ['originals'] + list(VARIANTS):
+            files = size = 0
+            for dirpath, _, names in os.walk(os.path.join(self.root, kind)):
+                for name in names:
+                    files += 1
+                    size += os.path.getsize(os.path.join(dirpath, name))
+            usage[kind] = {'files': files, 'bytes': size}
+        return usage
+
+def _older_than(path, seconds, now):
+    return now - os.path.getmtime(path) > seconds
+
+def compact(db, store, temp_dir='temp', grace_hours=GRACE_HOURS,
+            archive_after_days=ARCHIVE_AFTER_DAYS, dry_run=False):
+    """
+    Retention and compaction for ulcer photos:
+    1. images of ulcer_records still outside the store (temp_dir uploads from
+       before it existed) are copied in and their records re-pointed
+    2. files in temp_dir and store entries no record references, older than
+       grace_hours, are deleted
+    3. originals older than archive_after_days are re-encoded to ARCHIVE_EDGE
+    Returns counts of each step plus bytes freed
+    """
+    now = time.time()
+    grace = grace_hours * 3600
+    stats = {'imported': 0, 'temp_removed': 0, 'orphans_removed': 0, 'archived': 0, 'bytes_freed': 0}
+
+    def remove(path, counter):
+        stats[counter] += 1
+        stats['bytes_freed'] += os.path.getsize(path)
+        if not dry_run:
+            os.remove(path)
+
+    # 1. Legacy uploads referenced by records
+    image_paths = db.get_ulcer_image_paths()
+    moved = []
+    for image_path in image_paths:
+        if store.contains(image_path) or not os.path.exists(image_path):
+            continue
+        key = store._key(image_path)
+        if not dry_run:
+            with open(image_path, 'rb') as f:
+                store.put(f.read(), key)
+        moved.append((image_path, os.path.abspath(store._path('originals', key))))
+    stats['imported'] = len(moved)
+    if moved and not dry_run:
+        db.replace_ulcer_image_paths(moved)
+
+    referenced = {os.path.abspath(path) for path in image_paths}
+    referenced = (referenced - {old for old, _ in moved}) | {new for _, new in moved}
+
+    # 2. Unreferenced temp files and store entries
+    if os.path.isdir(temp_dir):
+        for entry in os.scandir(temp_dir):
+            if (entry.is_file() and os.path.abspath(entry.path) not in referenced
+                    and _older_than(entry.path, grace, now)):
+                remove(entry.path, 'temp_removed')
+
+    originals_dir = os.path.join(store.root, 'originals')
+    for dirpath, _, names in os.walk(originals_dir):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            if name.endswith('.tmp'):
+                if _older_than(path, grace, now):
+                    remove(path, 'orphans_removed')
+                continue
+            if os.path.abspath(path) not in referenced and _older_than(path, grace, now):
+                key = os.path.splitext(name)[0]
+                for variant in VARIANTS:
+                    if os.path.exists(store._path(variant, key)):
+                        remove(store._path(variant, key), 'orphans_removed')
+                remove(path, 'orphans_removed')
+
+            # 3. Archive tier for old originals
+            elif _older_than(path, archive_after_days * 86400, now):
+                with Image.open(path) as img:
+                    oversized = max(img.size) > ARCHIVE_EDGE
+                if oversized:
+                    with open(path, 'rb') as f:
+                        data = _compress_original(f.read(), ARCHIVE_EDGE, ARCHIVE_QUALITY)
+                    stats['archived'] += 1
+                    stats['bytes_freed'] += os.path.getsize(path) - len(data)
+                    if not dry_run:
+                        mtime = os.path.getmtime(path)
+                        _write(path, data)
+                        # Keep the age, so the file is not mistaken for a new upload
+                        os.utime(path, (mtime, mtime))
+
+    return stats
+
+if __name__ == '__main__':
+    import argparse
+    from src.database.database_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description='Compact the ulcer image store and temp/ uploads')
+    parser.add_argument('--db', default='diacare_db.sqlite3')
+    parser.add_argument('--store', default=IMAGE_STORE_DIR)
+    parser.add_argument('--temp-dir', default='temp')
+    parser.add_argument('--grace-hours', type=float, default=GRACE_HOURS)
+    parser.add_argument('--archive-after-days', type=float, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.db)
+    store = ImageStore(os.path.abspath(args.store))
+    stats = compact(db, store, args.temp_dir, args.grace_hours, args.archive_after_days, args.dry_run)
+    db.close()
+
+    print(', '.join(f"{name}: {value}" for name, value in stats.items() if name != 'bytes_freed')
+          + f", {stats['bytes_freed'] / 1e6:.1f} MB freed" + (' (dry run)' if args.dry_run else ''))
+    for kind, usage in store.usage().items():
+        print(f"  {kind}: {usage['files']} files, {usage['bytes'] / 1e6:.1f} MB")
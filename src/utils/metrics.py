@@ -0,0 +1,184 @@
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Off unless DIACARE_METRICS=1 (or enable() is called); disabled spans and
+# instrumented functions cost one flag check
+_enabled = os.environ.get('DIACARE_METRICS', '0') == '1'
+
+# Upper bounds in seconds, Prometheus-style
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_histograms = {}
+_counters = {}
+_lock = threading.Lock()
+
+class Histogram:
+    """Bucketed latency distribution with count and sum"""
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """Estimate, interpolated linearly within the bucket the quantile falls in"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+def enabled():
+    return _enabled
+
+def enable(flag=True):
+    global _enabled
+    _enabled = flag
+
+def observe(operation, seconds):
+    """Add one duration to operation's histogram"""
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(operation)
+        if histogram is None:
+            histogram = _histograms[operation] = Histogram()
+        histogram.observe(seconds)
+
+def increment(name, amount=1, **labels):
+    """Add amount to the counter name{labels}"""
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+_NULL_SPAN = nullcontext()
+
+def span(operation):
+    """Time the block into operation's histogram; errors are counted too"""
+    return _span(operation) if _enabled else _NULL_SPAN
+
+@contextmanager
+def _span(operation):
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        increment('errors', operation=operation)
+        raise
+    finally:
+        observe(operation, time.perf_counter() - start)
+
+def instrument(operation):
+    """Decorator form of span"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _span(operation):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def snapshot():
+    """
+    Current metrics as plain data
+    Returns {'operations': {name: {count, total_seconds, mean_ms, p50_ms, p95_ms, p99_ms}},
+    'counters': {name{labels}: value}}
+    """
+    with _lock:
+        operations = {}
+        for operation, h in sorted(_histograms.items()):
+            operations[operation] = {
+                'count': h.count,
+                'total_seconds': h.sum,
+                'mean_ms': h.sum / h.count * 1000 if h.count else 0.0,
+                'p50_ms': h.quantile(0.5) * 1000,
+                'p95_ms': h.quantile(0.95) * 1000,
+                'p99_ms': h.quantile(0.99) * 1000,
+            }
+        counters = {_series(name, labels): value for (name, labels), value in sorted(_counters.items())}
+    return {'operations': operations, 'counters': counters}
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+def _series(name, labels):
+    if not labels:
+        return name
+    # Escape backslashes and quotes in label values for the text format
+    pairs = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                     for k, v in labels)
+    return f"{name}{{{pairs}}}"
+
+def render_prometheus(prefix='diacare'):
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        if _histograms:
+            name = f"{prefix}_operation_duration_seconds"
+            lines.append(f"# HELP {name} Time spent in instrumented operations")
+            lines.append(f"# TYPE {name} histogram")
+            for operation, h in sorted(_histograms.items()):
+                cumulative = 0
+                for bound, n in zip(h.buckets + (float('inf'),), h.counts):
+                    cumulative += n
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{_series(name + '_bucket', (('operation', operation), ('le', le)))} {cumulative}")
+                lines.append(f"{_series(name + '_sum', (('operation', operation),))} {h.sum!r}")
+                lines.append(f"{_series(name + '_count', (('operation', operation),))} {h.count}")
+
+        for counter in sorted({name for name, _ in _counters}):
+            name = f"{prefix}_{counter}_total"
+            lines.append(f"# TYPE {name} counter")
+            for (counter_name, labels), value in sorted(_counters.items()):
+                if counter_name == counter:
+                    lines.append(f"{_series(name, labels)} {value}")
+
+    return '\n'.join(lines) + '\n'
+
+def start_http_server(port=9464, host='127.0.0.1'):
+    """
+    Serve render_prometheus() at /metrics from a daemon thread
+    Binds to localhost by default; returns the server
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from src.database.connection import ConnectionPool
+from src.utils import metrics
+
+def file_fingerprint(path, chunk_size=1 << 20):
+    """Short sha256 of a model file, used to tag cache entries with the model version"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+def features_key(input_data, columns):
+    """Key for a feature dict, normalized to floats in a fixed column order"""
+    vector = ','.join(repr(float(input_data[column])) for column in columns)
+    return hashlib.sha256(vector.encode()).hexdigest()
+
+def _plain(value):
+    # numpy scalars -> builtin types so results serialize and compare cleanly
+    return value.item() if hasattr(value, 'item') else value
+
+class PredictionCache:
+    """
+    LRU cache of prediction results keyed by input hash
+    Entries are tagged with model_version, so a retrained model never serves
+    stale results. With disk_path, misses fall through to a SQLite tier that
+    survives restarts and is shared between processes
+    """
+    def __init__(self, namespace, model_version, max_entries=1024, disk_path=None):
+        self.namespace = namespace
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'memory_hits': 0, 'disk_hits': 0}
+        self._pool = None
+
+        if disk_path:
+            self._pool = ConnectionPool(disk_path)
+            with self._pool.transaction() as conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS prediction_cache (
+                        namespace TEXT NOT NULL,
+                        model_version TEXT NOT NULL,
+                        key TEXT NOT NULL,
+                        result TEXT NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (namespace, model_version, key)
+                    )
+                ''')
+
+    def get(self, key):
+        """Cached result dict for key, or None on a miss"""
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                self._stats['memory_hits'] += 1
+                result = dict(result)
+        if result is not None:
+            metrics.increment('prediction_cache_lookups', cache=self.namespace, result='memory_hit')
+            return result
+
+        if self._pool is not None:
+            row = self._pool.connection().execute('''
+                SELECT result FROM prediction_cache
+                WHERE namespace = ? AND model_version = ? AND key = ?
+            ''', (self.namespace, self.model_version, key)).fetchone()
+            if row is not None:
+                result = json.loads(row['result'])
+                with self._lock:
+                    self._stats['hits'] += 1
+                    self._stats['disk_hits'] += 1
+                metrics.increment('prediction_cache_lookups', cache=self.namespace, result='disk_hit')
+                self._remember(key, result)
+                return dict(result)
+
+        with self._lock:
+            self._stats['misses'] += 1
+        metrics.increment('prediction_cache_lookups', cache=self.namespace, result='miss')
+        return None
+
+    def put(self, key, result):
+        result = {k: _plain(v) for k, v in result.items()}
+        self._remember(key, result)
+
+        if self._pool is not None:
+            with self._pool.transaction() as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO prediction_cache (namespace, model_version, key, result)
+                    VALUES (?, ?, ?, ?)
+                ''', (self.namespace, self.model_version, key, json.dumps(result)))
+
+    def get_or_compute(self, key, compute):
+        """Return the cached result for key, running compute() only on a miss"""
+        result = self.get(key)
+        if result is None:
+            result = compute()
+            self.put(key, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['model_version'] = self.model_version
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
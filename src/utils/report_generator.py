@@ -1,59 +1,140 @@
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import io
 import os
+import time
+import uuid
+
+from src.utils.metrics import instrument, span
+
+# Embedded images are pre-shrunk to their 4x3 inch print size at this resolution
+PRINT_DPI = 150
+IMAGE_BOX = (4 * inch, 3 * inch)
+
+FOOTER_TEXT = ("This report was generated automatically by DiaCare AI system. "
+               "Please consult with a healthcare professional for proper medical advice.")
+
+_styles = None
+
+def shared_styles():
+    """Stylesheet, header style and table style, built once per process"""
+    global _styles
+    if _styles is None:
+        sheet = getSampleStyleSheet()
+        _styles = {
+            'sheet': sheet,
+            'header': ParagraphStyle(
+                'CustomHeader',
+                parent=sheet['Heading1'],
+                fontSize=24,
+                spaceAfter=30
+            ),
+            'table': TableStyle([
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+                ('PADDING', (0, 0), (-1, -1), 6),
+            ]),
+        }
+    return _styles
+
+def shrink_image(image_path):
+    """
+    JPEG bytes of the image resized to the report's 4x3 inch box at PRINT_DPI,
+    instead of embedding the full-resolution upload
+    Images from the image store already have this copy, made at upload
+    """
+    from src.utils.image_store import stored_variant
+
+    stored = stored_variant(image_path, 'print')
+    if stored is not None:
+        with open(stored, 'rb') as f:
+            return f.read()
+
+    from PIL import Image as PILImage
+
+    size = (int(IMAGE_BOX[0] / inch * PRINT_DPI), int(IMAGE_BOX[1] / inch * PRINT_DPI))
+    with PILImage.open(image_path) as img:
+        img = img.convert('RGB').resize(size, PILImage.BILINEAR)
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+def report_filename(name):
+    """Unique PDF file name: microsecond timestamp plus a random suffix"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    return f"{name.replace(' ', '_').replace(os.sep, '_')}_Report_{timestamp}_{uuid.uuid4().hex[:8]}.pdf"
 
 class ReportGenerator:
-    def __init__(self, output_dir):
+    """
+    Renders assessment PDFs into output_dir
+    With db, every written report is recorded in its reports table
+    """
+    def __init__(self, output_dir, db=None):
         self.output_dir = output_dir
+        self.db = db
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
-        
-    def generate_report(self, patient_data, diabetes_result=None, ulcer_result=None):
+
+    @instrument('report.generate')
+    def generate_report(self, patient_data, diabetes_result=None, ulcer_result=None,
+                        filename=None, image_data=None, patient_id=None, assessment_id=None):
         # Create unique filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{patient_data['name'].replace(' ', '_')}_Report_{timestamp}.pdf"
+        if filename is None:
+            filename = report_filename(patient_data['name'])
         filepath = os.path.join(self.output_dir, filename)
-        
+
         # Create PDF document
         doc = SimpleDocTemplate(filepath, pagesize=letter)
-        styles = getSampleStyleSheet()
+        story = self.build_story(patient_data, diabetes_result, ulcer_result, image_data)
+
+        # Build PDF
+        with span('report.build_pdf'):
+            doc.build(story)
+        self._index(filepath, diabetes_result, ulcer_result, patient_id, assessment_id)
+        return filepath
+
+    def _index(self, filepath, diabetes_result=None, ulcer_result=None,
+               patient_id=None, assessment_id=None):
+        if self.db is None:
+            return
+        assessment_type = 'ulcer' if ulcer_result else 'diabetes' if diabetes_result else None
+        self.db.add_report(filepath, os.path.getsize(filepath), patient_id,
+                           assessment_type, assessment_id)
+
+    def build_story(self, patient_data, diabetes_result=None, ulcer_result=None, image_data=None):
+        """
+        Flowables for one report
+        image_data: pre-shrunk JPEG bytes for the ulcer image, if already computed
+        """
+        styles = shared_styles()
         story = []
-        
+
         # Add header
-        header_style = ParagraphStyle(
-            'CustomHeader',
-            parent=styles['Heading1'],
-            fontSize=24,
-            spaceAfter=30
-        )
-        story.append(Paragraph("DiaCare AI Medical Report", header_style))
+        story.append(Paragraph("DiaCare AI Medical Report", styles['header']))
         story.append(Spacer(1, 12))
-        
+
         # Add patient information
-        story.append(Paragraph("Patient Information", styles['Heading2']))
+        story.append(Paragraph("Patient Information", styles['sheet']['Heading2']))
         patient_info = [
             ["Name:", patient_data['name']],
             ["Age:", str(patient_data['age'])],
             ["Gender:", patient_data['gender']],
             ["Date:", datetime.now().strftime("%Y-%m-%d %H:%M:%S")]
         ]
-        
+
         t = Table(patient_info, colWidths=[2*inch, 4*inch])
-        t.setStyle(TableStyle([
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-            ('PADDING', (0, 0), (-1, -1), 6),
-        ]))
+        t.setStyle(styles['table'])
         story.append(t)
         story.append(Spacer(1, 20))
-        
+
         # Add diabetes results if available
         if diabetes_result:
-            story.append(Paragraph("Diabetes Risk Assessment", styles['Heading2']))
+            story.append(Paragraph("Diabetes Risk Assessment", styles['sheet']['Heading2']))
             risk_level = "High" if diabetes_result['prediction'] == 1 else "Low"
             diabetes_info = [
                 ["Risk Level:", risk_level],
@@ -62,44 +143,113 @@ class ReportGenerator:
                 ["BMI:", str(diabetes_result['bmi'])],
                 ["Blood Pressure:", str(diabetes_result['blood_pressure'])]
             ]
-            
+
             t = Table(diabetes_info, colWidths=[2*inch, 4*inch])
-            t.setStyle(TableStyle([
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-                ('PADDING', (0, 0), (-1, -1), 6),
-            ]))
+            t.setStyle(styles['table'])
             story.append(t)
             story.append(Spacer(1, 20))
-        
+
         # Add ulcer detection results if available
         if ulcer_result and 'image_path' in ulcer_result:
-            story.append(Paragraph("Foot Ulcer Detection", styles['Heading2']))
-            
-            # Add the analyzed image
-            if os.path.exists(ulcer_result['image_path']):
-                img = Image(ulcer_result['image_path'], width=4*inch, height=3*inch)
+            story.append(Paragraph("Foot Ulcer Detection", styles['sheet']['Heading2']))
+
+            # Add the analyzed image, downscaled to its print size
+            if image_data is None and os.path.exists(ulcer_result['image_path']):
+                with span('report.shrink_image'):
+                    image_data = shrink_image(ulcer_result['image_path'])
+            if image_data is not None:
+                img = Image(io.BytesIO(image_data), width=IMAGE_BOX[0], height=IMAGE_BOX[1])
                 story.append(img)
                 story.append(Spacer(1, 12))
-            
+
             ulcer_info = [
                 ["Detection Result:", ulcer_result['prediction']],
                 ["Confidence:", f"{ulcer_result['probability']:.1f}%"]
             ]
-            
+
             t = Table(ulcer_info, colWidths=[2*inch, 4*inch])
-            t.setStyle(TableStyle([
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-                ('PADDING', (0, 0), (-1, -1), 6),
-            ]))
+            t.setStyle(styles['table'])
             story.append(t)
-        
+
         # Add footer
         story.append(Spacer(1, 30))
-        footer_text = "This report was generated automatically by DiaCare AI system. Please consult with a healthcare professional for proper medical advice."
-        story.append(Paragraph(footer_text, styles['Italic']))
-        
-        # Build PDF
-        doc.build(story)
-        return filepath
+        story.append(Paragraph(FOOTER_TEXT, styles['sheet']['Italic']))
+
+        return story
+
+    def generate_batch(self, reports, merged_filename=None, processes=None):
+        """
+        Render many reports
+        reports: list of dicts with patient_data and optional diabetes_result,
+        ulcer_result, patient_id and assessment_id
+        merged_filename: write one PDF with a page break between reports; otherwise
+        each report gets its own file, rendered across a process pool
+        Returns {'paths', 'reports', 'seconds', 'reports_per_sec'}
+        """
+        start = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            if merged_filename:
+                # Image shrinking is the expensive part, so do it in parallel;
+                # one document can only be laid out by a single process
+                images = list(pool.map(_shrink_report_image, reports))
+                story = []
+                for i, (report, image_data) in enumerate(zip(reports, images)):
+                    if i:
+                        story.append(PageBreak())
+                    story.extend(self.build_story(
+                        report['patient_data'], report.get('diabetes_result'),
+                        report.get('ulcer_result'), image_data
+                    ))
+                paths = [os.path.join(self.output_dir, merged_filename)]
+                SimpleDocTemplate(paths[0], pagesize=letter).build(story)
+                self._index(paths[0])
+            else:
+                filenames = [report_filename(report['patient_data']['name']) for report in reports]
+                paths = list(pool.map(_render_report, [self.output_dir] * len(reports),
+                                      reports, filenames, chunksize=8))
+                # Workers cannot share the database connection; index here
+                for path, report in zip(paths, reports):
+                    self._index(path, report.get('diabetes_result'), report.get('ulcer_result'),
+                                report.get('patient_id'), report.get('assessment_id'))
+
+        seconds = time.perf_counter() - start
+        return {
+            'paths': paths,
+            'reports': len(reports),
+            'seconds': seconds,
+            'reports_per_sec': len(reports) / seconds if seconds > 0 else 0.0
+        }
+
+def _render_report(output_dir, report, filename):
+    # Process pool worker; styles are shared across calls within the worker
+    return ReportGenerator(output_dir).generate_report(
+        report['patient_data'],
+        diabetes_result=report.get('diabetes_result'),
+        ulcer_result=report.get('ulcer_result'),
+        filename=filename
+    )
+
+def _shrink_report_image(report):
+    ulcer_result = report.get('ulcer_result')
+    if ulcer_result and os.path.exists(ulcer_result.get('image_path', '')):
+        return shrink_image(ulcer_result['image_path'])
+    return None
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Render a bundle of PDF reports')
+    parser.add_argument('reports', help='JSON list of {patient_data, diabetes_result, ulcer_result}')
+    parser.add_argument('--output-dir', default='reports')
+    parser.add_argument('--merged', help='Write a single PDF with this file name')
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.reports) as f:
+        reports = json.load(f)
+
+    stats = ReportGenerator(args.output_dir).generate_batch(reports, args.merged, args.processes)
+    print(f"Rendered {stats['reports']} reports in {stats['seconds']:.2f}s "
+          f"({stats['reports_per_sec']:.1f} reports/sec) into {len(stats['paths'])} file(s)")
@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+
+class ReportJobQueue:
+    """
+    Builds PDF reports on a background worker pool
+    Each job is recorded in the report_jobs table (queued -> running ->
+    done/failed), so any session or process can poll its status by id
+    """
+    def __init__(self, report_gen, db, max_workers=2):
+        self.report_gen = report_gen
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='report-worker')
+
+    def submit(self, patient_data, patient_id=None, diabetes_result=None, ulcer_result=None,
+               assessment_id=None):
+        """Queue a report; returns the job id immediately"""
+        job_id = self.db.add_report_job(patient_id)
+        self._executor.submit(self._run, job_id, patient_data, diabetes_result, ulcer_result,
+                              patient_id, assessment_id)
+        return job_id
+
+    def status(self, job_id):
+        """The job's report_jobs row as a dict, or None for an unknown id"""
+        return self.db.get_report_job(job_id)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job_id, patient_data, diabetes_result, ulcer_result, patient_id, assessment_id):
+        self.db.update_report_job(job_id, 'running')
+        try:
+            report_path = self.report_gen.generate_report(
+                patient_data,
+                diabetes_result=diabetes_result,
+                ulcer_result=ulcer_result,
+                patient_id=patient_id,
+                assessment_id=assessment_id
+            )
+        except Exception as e:
+            self.db.update_report_job(job_id, 'failed', error=str(e))
+        else:
+            self.db.update_report_job(job_id, 'done', report_path=report_path)
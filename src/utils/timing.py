@@ -0,0 +1,35 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from src.utils import metrics
+
+# Reference point for startup timings: first import of this module
+PROCESS_START = time.perf_counter()
+
+_timings = {}
+_lock = threading.Lock()
+
+@contextmanager
+def timed(name):
+    """Record how long the block takes, in seconds, under name"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+def record(name, seconds):
+    """Keep the latest duration under name, and add it to the metrics histograms"""
+    with _lock:
+        _timings[name] = seconds
+    metrics.observe(name, seconds)
+
+def mark(name):
+    """Record the time elapsed since process start under name, the first time only"""
+    with _lock:
+        _timings.setdefault(name, time.perf_counter() - PROCESS_START)
+
+def timings():
+    with _lock:
+        return dict(_timings)
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from src.models.diabetes_model import FEATURE_COLUMNS
+from src.models.forest_engine import CompiledForest, check_parity
+
+@pytest.fixture(scope='module')
+def data():
+    rng = np.random.default_rng(0)
+    n = 400
+    # Integer-valued columns (like Pregnancies, Glucose, Age) give many
+    # repeated values, so thresholds fall between neighbouring integers
+    X = np.column_stack([
+        rng.integers(0, 15, n), rng.integers(50, 200, n), rng.integers(40, 120, n),
+        rng.integers(0, 60, n), rng.integers(0, 400, n), rng.normal(32, 7, n),
+        rng.gamma(2.0, 0.25, n), rng.integers(21, 80, n),
+    ]).astype(np.float64)
+    y = ((X[:, 1] > 125) ^ (rng.random(n) < 0.15)).astype(int)
+    return pd.DataFrame(X, columns=FEATURE_COLUMNS), y
+
+@pytest.fixture(scope='module')
+def model(data):
+    X, y = data
+    return RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0).fit(X, y)
+
+def _threshold_rows(model, X):
+    # Rows whose feature value sits exactly on a split threshold, to pin down
+    # the <= comparison (sklearn compares float32 inputs to float64 thresholds)
+    rows = []
+    for estimator in model.estimators_[:5]:
+        tree = estimator.tree_
+        for node in np.flatnonzero(tree.children_left != -1)[:20]:
+            row = X.iloc[node % len(X)].to_numpy(copy=True)
+            row[tree.feature[node]] = np.float32(tree.threshold[node])
+            rows.append(row)
+    return pd.DataFrame(rows, columns=FEATURE_COLUMNS)
+
+def test_matches_sklearn(data, model):
+    X, _ = data
+    compiled = CompiledForest.from_sklearn(model)
+    np.testing.assert_array_equal(compiled.predict_proba(X), model.predict_proba(X))
+    np.testing.assert_array_equal(compiled.predict(X), model.predict(X))
+    assert check_parity(model, compiled, X) == 0.0
+
+def test_matches_sklearn_on_thresholds(data, model):
+    ties = _threshold_rows(model, data[0])
+    compiled = CompiledForest.from_sklearn(model)
+    np.testing.assert_array_equal(compiled.predict_proba(ties), model.predict_proba(ties))
+    np.testing.assert_array_equal(compiled.predict(ties), model.predict(ties))
+
+def test_single_row_and_reordered_columns(data, model):
+    X, _ = data
+    compiled = CompiledForest.from_sklearn(model)
+    row = X.iloc[:1]
+    np.testing.assert_array_equal(compiled.predict_proba(row.to_numpy()), model.predict_proba(row))
+    reordered = X[FEATURE_COLUMNS[::-1]]
+    np.testing.assert_array_equal(compiled.predict_proba(reordered), model.predict_proba(X))
+
+def test_save_load_round_trip(data, model, tmp_path):
+    X, _ = data
+    path = tmp_path / 'diabetes_model.npz'
+    CompiledForest.from_sklearn(model).save(path)
+    loaded = CompiledForest.load(path)
+    np.testing.assert_array_equal(loaded.predict_proba(X), model.predict_proba(X))
+    np.testing.assert_array_equal(loaded.classes_, model.classes_)
+    assert list(loaded.feature_names) == FEATURE_COLUMNS
+
+def test_rejects_non_finite(model):
+    compiled = CompiledForest.from_sklearn(model)
+    with pytest.raises(ValueError):
+        compiled.predict_proba(np.full((1, len(FEATURE_COLUMNS)), np.nan))